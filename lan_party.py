@@ -1,42 +1,329 @@
+import os
 import random
+import time
+from collections import defaultdict
 import pygame
 import pygame.time
 from pygame.locals import *
 from abc import ABC, abstractmethod
+from lan_party_assets import assets, text_cache
+from lan_party_audio import audio
+from lan_party_engine import Party, type_names, type_sprites
+from lan_party_layout import Layout, Viewport, canvas_size
+from lan_party_odds import BustOdds
+from lan_party_profiler import profiler
+from lan_party_replay import Session, Recorder, START, DOOR, END_DAY, CONTINUE, NEXT_DAY, BUY
+from lan_party_save import Autosaver, load as load_save
+from lan_party_solver import StoppingSolver
+
+# Posted by the network thread when the server sent an update, see GameState.sync
+NETWORK_UPDATE = pygame.USEREVENT
+
+# Events with a mouse position, mapped from the window to the canvas by GameState.dispatch
+POSITION_EVENTS = (MOUSEMOTION, MOUSEBUTTONDOWN, MOUSEBUTTONUP)
 
 
 class Screen(ABC):
+    # Background image, loaded on first draw
+    background_path = None
+    background_alpha = True
+
+    # (path, logical size, alpha) of the other images this screen uses, decoded ahead of time by GameState
+    images = []
+
+    # Methods timed as sub-timers while the profiler overlay is on
+    profiled = ("check_dirty", "draw")
+
+    # How far between the last fixed update and the next this frame is, set by GameState
+    alpha = 1.0
+
+    # StatCounters shared by the screens showing COIN and REP, set by GameState.
+    # Without them the party's numbers are shown as they are
+    counters = None
+
     def __init__(self, screen):
+        # Positions and sizes are logical 1920x1080 ones, turned into pixels on
+        # this canvas by self.ui.  layout() does that, and again after a resize
         self.screen = screen
+        self.ui = Layout(screen.get_size())
         self.SCREEN_WIDTH, self.SCREEN_HEIGHT = screen.get_size()
-        self.background = None
-        self.font = pygame.font.SysFont('Arial', 80)
+
+        # Dirty rectangle tracking for render()
+        self.full_redraw = True
+        self.dirty_rects = []
+
+        # event type -> handlers, filled in by the screen and by GameState
+        self.handlers = defaultdict(list)
+        self.on(MOUSEMOTION, self.update_hover)
+        self.layout()
+
+    def layout(self):
+        """Make the fonts and buttons and work out where things go for the canvas size."""
+        self.font = self.ui.font('Arial', 80)
+        self.hover_grid = HoverGrid()
+
+    def resize(self, screen):
+        """Draw on a new canvas from now on, laid out again if it's a different size."""
+        self.screen = screen
+        if screen.get_size() != self.ui.canvas_size:
+            self.ui = Layout(screen.get_size())
+            self.SCREEN_WIDTH, self.SCREEN_HEIGHT = screen.get_size()
+            self.layout()
+        self.invalidate()
+
+    @property
+    def background(self):
+        return assets.image(self.background_path, self.ui.canvas_size, self.background_alpha)
 
     @abstractmethod
     def draw(self):
         ...
 
+    def on(self, event_type, handler):
+        """Call handler(event) for events of this type while the screen is showing."""
+        self.handlers[event_type].append(handler)
+
+    def handle(self, event):
+        for handler in self.handlers.get(event.type, ()):
+            handler(event)
+
+    def update_hover(self, event):
+        for rect in self.hover_grid.update(event.pos):
+            self.invalidate(rect)
+
+    @staticmethod
+    def render_text(font, text, antialias, colour):
+        """Render text through the shared cache, so unchanged labels aren't rasterized again."""
+        return text_cache.render(font, text, antialias, colour)
+
+    @property
+    def animating(self):
+        """True while the screen changes without input, which keeps the frame rate up."""
+        return self.counters is not None and self.counters.animating
+
+    def update(self, dt):
+        """Advance the screen's animations by one fixed step of dt seconds."""
+
+    def shown_stats(self):
+        """Turns, COIN and REP as they should be drawn this frame."""
+        party = self.party
+        if self.counters is None:
+            return party.turns_remaining, party.coin, party.rep
+        return party.turns_remaining, self.counters.coin.shown(self.alpha), self.counters.rep.shown(self.alpha)
+
+    def invalidate_texts(self, old_texts, new_texts, font):
+        """Invalidate where a list of (text, pos) labels was drawn and where the new ones go."""
+        for texts in (old_texts or [], new_texts):
+            for text, pos in texts:
+                self.invalidate(pygame.Rect(pos, font.size(text)))
+
+    def invalidate(self, rect=None):
+        """Mark a rect (or the whole screen when None) as needing a redraw."""
+        if rect is None:
+            self.full_redraw = True
+        else:
+            self.dirty_rects.append(pygame.Rect(rect))
+
+    def check_dirty(self):
+        """Compare the game state against what was last drawn and invalidate what changed."""
+
+    def render(self):
+        """Redraw only the dirty parts of the screen and return the rects to push to the display."""
+        self.check_dirty()
+
+        if self.full_redraw:
+            self.draw()
+            rects = [self.screen.get_rect()]
+        else:
+            rects = merge_rects(self.dirty_rects)
+            for rect in rects:
+                # Everything outside the clip is skipped by SDL
+                self.screen.set_clip(rect)
+                self.draw()
+            self.screen.set_clip(None)
+
+        self.full_redraw = False
+        self.dirty_rects = []
+        return rects
+
     @abstractmethod
     def play_music(self):
         ...
 
     @staticmethod
     def stop_music():
-        pygame.mixer.music.stop()
+        audio.stop_music()
+
+
+def merge_rects(rects):
+    """Union overlapping rects so nothing gets drawn twice."""
+    merged = []
+    for rect in rects:
+        rect = rect.copy()
+        i = 0
+        while i < len(merged):
+            if rect.colliderect(merged[i]):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+
+def ease_out(t):
+    return 1 - (1 - t) * (1 - t)
+
+
+class Tween:
+    """Progress from 0 to 1 over duration seconds, advanced by fixed updates.
+
+    Keeps the progress of the last two updates so a frame drawn between them
+    can blend the two (value(alpha)) and move smoothly at any frame rate.
+    """
+    __slots__ = ("duration", "elapsed", "previous", "current")
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.elapsed = 0.0
+        self.previous = self.current = 0.0
+
+    def update(self, dt):
+        self.previous = self.current
+        self.elapsed += dt
+        self.current = min(1.0, self.elapsed / self.duration)
+
+    @property
+    def done(self):
+        # Only once frames can't land anywhere short of the end either
+        return self.previous >= 1.0
+
+    def value(self, alpha=1.0):
+        return self.previous + (self.current - self.previous) * alpha
+
+
+class Counter:
+    """A number on screen that counts up to a new, higher value instead of jumping.
+
+    Going down (spending in the shop) shows straight away.
+    """
+
+    def __init__(self, value=0, duration=0.6):
+        self.duration = duration
+        self.start = self.target = value
+        self.tween = None
+
+    def update(self, target, dt):
+        if target != self.target:
+            shown = self.shown()
+            self.start = shown if target > shown else target
+            self.target = target
+            self.tween = Tween(self.duration) if target > shown else None
+        if self.tween is not None:
+            self.tween.update(dt)
+            if self.tween.done:
+                self.tween = None
+
+    def shown(self, alpha=1.0):
+        if self.tween is None:
+            return self.target
+        return round(self.start + (self.target - self.start) * ease_out(self.tween.value(alpha)))
+
+
+class StatCounters:
+    """The party's COIN and REP as drawn.  Shared by the basement and the shop,
+    so the count that starts when a day is banked carries on in the shop."""
+
+    def __init__(self, party, duration=0.6):
+        self.party = party
+        self.coin = Counter(party.coin, duration)
+        self.rep = Counter(party.rep, duration)
+
+    def update(self, dt):
+        self.coin.update(self.party.coin, dt)
+        self.rep.update(self.party.rep, dt)
+
+    @property
+    def animating(self):
+        return self.coin.tween is not None or self.rep.tween is not None
+
+
+class FrameScheduler:
+    """Paces the main loop.
+
+    Runs at the fps cap while something is animating or the player did
+    something recently, otherwise (in power saving mode) sleeps in
+    event.wait until the next input instead of spinning through static frames.
+    """
+
+    def __init__(self, fps=60, power_saving=True, linger=0.5, idle_timeout_ms=1000):
+        self.fps = fps
+        self.power_saving = power_saving
+        self.linger = linger  # Seconds to stay at full rate after the last input
+        self.idle_timeout_ms = idle_timeout_ms
+        self.clock = pygame.time.Clock()
+        self.last_input = time.perf_counter()
+        self.idle_waits = 0
+
+    def next_events(self, animating=False):
+        """Wait for the next frame (or the next input when idle) and return the events to handle."""
+        idle = time.perf_counter() - self.last_input > self.linger
+        if self.power_saving and idle and not animating:
+            self.idle_waits += 1
+            event = pygame.event.wait(self.idle_timeout_ms)
+            events = [] if event.type == NOEVENT else [event]
+            events += pygame.event.get()
+            # Don't count the sleep as a slow frame
+            self.clock.tick()
+        else:
+            self.clock.tick(self.fps)
+            events = pygame.event.get()
+
+        if events:
+            self.last_input = time.perf_counter()
+        return events
+
+    def get_fps(self):
+        return self.clock.get_fps()
+
+
+class HoverGrid:
+    """Buttons bucketed by grid cell, so a mouse position is only tested against the buttons near it."""
+
+    def __init__(self, cell_size=128):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+        self.hovered = []
+
+    def add(self, button):
+        size = self.cell_size
+        for cell_x in range(button.rect.left // size, (button.rect.right - 1) // size + 1):
+            for cell_y in range(button.rect.top // size, (button.rect.bottom - 1) // size + 1):
+                self.cells[(cell_x, cell_y)].append(button)
+
+    def buttons_at(self, pos):
+        cell = self.cells.get((pos[0] // self.cell_size, pos[1] // self.cell_size), ())
+        return [button for button in cell if button.rect.collidepoint(pos)]
+
+    def update(self, pos):
+        """Move the hover to pos and return the rects of the buttons that need redrawing."""
+        hovered = self.buttons_at(pos)
+        changed = []
+        for button in self.hovered + hovered:
+            if button.update_hover(pos):
+                changed.append(button.rect)
+        self.hovered = hovered
+        return changed
 
 
 class Button:
     def __init__(self, x, y, image_path, scale=None, hover_image_path=None):
-        self.image = pygame.image.load(image_path).convert_alpha()
-        if scale:
-            self.image = pygame.transform.scale(self.image, scale)
+        self.image = assets.image(image_path, scale)
         self.rect = self.image.get_rect(topleft=(x, y))
 
         self.hover_image = None
         if hover_image_path:
-            self.hover_image = pygame.image.load(hover_image_path).convert_alpha()
-            if scale:
-                self.hover_image = pygame.transform.scale(self.hover_image, scale)
+            self.hover_image = assets.image(hover_image_path, scale)
         self.is_hovered = False
 
     def draw(self, screen):
@@ -54,192 +341,465 @@ class Button:
         return False
 
     def update_hover(self, mouse_pos):
-        self.is_hovered = self.rect.collidepoint(mouse_pos)
+        """Update the hover state, returns True if the button needs redrawing."""
+        was_hovered = self.is_hovered
+        self.is_hovered = bool(self.rect.collidepoint(mouse_pos))
+        return was_hovered != self.is_hovered and self.hover_image is not None
 
 
 class TitleScreen(Screen, ABC):
+    background_path = 'Images/Title.png'
+    background_alpha = False
+
     def __init__(self, screen, party):
-        super().__init__(screen)
-        self.background = self.title_background = pygame.image.load('Images/Title.png').convert()
-        self.background = pygame.transform.scale(self.background, (1920, 1080))
-        self.font = pygame.font.SysFont('Arial', 40)
         self.party = party
+        super().__init__(screen)
+
+    def layout(self):
+        super().layout()
+        self.font = self.ui.font('Arial', 40)
 
     def draw(self):
         self.screen.blit(self.background, (0, 0))
 
     def play_music(self):
-        pygame.mixer.init()
-        pygame.mixer.music.load('Sounds/darkwave.wav')
-        pygame.mixer.music.set_volume(0.1)  # Set volume (0.0 to 1.0)
-        pygame.mixer.music.play(-1)  # Loop the music (-1 means infinite loop)
+        audio.play_track('Sounds/darkwave.wav', 0.1)
 
 
 class BasementScreen(Screen, ABC):
-    def __init__(self, screen, party):
-        super().__init__(screen)
-        self.party = party
-        self.background = self.basement_background = pygame.image.load('Images/Basement.png').convert()
-        self.background = pygame.transform.scale(self.background, (1920, 1080))
+    background_path = 'Images/Basement.png'
+    background_alpha = False
+    profiled = Screen.profiled + ("draw_desks", "draw_gamer", "draw_stats", "draw_odds")
+    images = [('Images/Door_Button.png', (170, 192), True),
+              ('Images/Door_Button_on_Hover.png', (170, 192), True),
+              ('Images/End_day_button1.png', (400, 125), True),
+              ('Images/End_day_button2.png', (400, 125), True)]
+    images += [(path, (200, 200), True) for path in ['Images/Desk.png'] + [path for path in type_sprites if path]]
 
-        # Door Button (invisible)
-        self.door_button = Button(240, 24, 'Images/Door_Button.png', (170, 192), "Images/Door_Button_on_Hover.png")
+    # Drawn for gamer types without a sprite of their own
+    default_sprite = 'Images/Gamer.png'
 
-        # End Day Button
-        self.end_d_button = Button(1375, 925, "Images/End_day_button1.png", (400, 125), "Images/End_day_button2.png")
+    # Desk view zoom levels, 1 is the original 7 desks a row
+    zoom_levels = (1.0, 0.5, 0.25, 0.125)
 
-        # Desk dimensions and spacing
+    def __init__(self, screen, party):
+        self.party = party
+
+        # Desk dimensions and spacing, logical at zoom 1
         self.desk_width = 200  # Width of each desk
         self.desk_height = 200  # Height of each desk
         self.desk_spacing = 35  # Spacing between desks
-        self.desks_per_row = 7  # Number of desks per row
 
         # Offsets to shift desks down and to the right
         self.horizontal_offset = 155  # Horizontal shift
         self.vertical_offset = 280  # Vertical shift
+        self.floor_bottom = 960  # Where the floor meets the frame, the odds go on a panel below it
 
-        # Desk image
-        self.desk_image = pygame.image.load('Images/Desk.png').convert_alpha()
-        self.desk_image = pygame.transform.scale(self.desk_image, (self.desk_width, self.desk_height))
-
-        # Normal Gamer image
-        self.normal_gamer_image = pygame.image.load('Images/Gamer.png').convert_alpha()
-        self.normal_gamer_image = pygame.transform.scale(self.normal_gamer_image, (self.desk_width, self.desk_height))
-
-        # Angry
-        self.angry_gamer_image = pygame.image.load('Images/Gamer_Angry.png').convert_alpha()
-        self.angry_gamer_image = pygame.transform.scale(self.angry_gamer_image, (self.desk_width, self.desk_height))
-        # Rich
-        self.rich_gamer_image = pygame.image.load('Images/Gamer_Rich.png').convert_alpha()
-        self.rich_gamer_image = pygame.transform.scale(self.rich_gamer_image, (self.desk_width, self.desk_height))
+        # Where the view is zoomed and scrolled to (in pixels), kept through resizes
+        self.zoom_level = 0
+        self.scroll = 0
+        super().__init__(screen)
+        self.on(MOUSEWHEEL, self.wheel)
+        self.on(KEYDOWN, self.view_key)
+
+        # Odds for the next door click
+        self.odds = BustOdds(party)
+        self.show_odds = True
+
+        # Best play hint, only worked out while few enough seats are left to solve in a frame.
+        # The solver doesn't know about abilities, so there's no hint when they're in play
+        self.solver = StoppingSolver() if self.odds.exact else None
+        self.hint_max_seats = 12
+
+        # Gamers walking from the door to their desk: seat -> Tween.  Seats from
+        # arrived on (in arrival_list, while it's still the party) haven't
+        # been seen by update() yet and aren't drawn until they start walking.
+        # More than max_walkers at once just appear at their desks
+        self.walk_time = 0.35
+        self.max_walkers = 50
+        self.walkers = {}
+        self.arrival_list = party.in_party
+        self.arrived = len(party.in_party)
+
+        # What was on screen last frame, for check_dirty
+        self.drawn_stats = None
+        self.drawn_odds = None
+        self.drawn_walkers = []
+        self.drawn_desks = 0
+        self.drawn_gamers = []
+        self.drawn_gamer_count = 0
+        self.drawn_scrollbar = None
+
+    def layout(self):
+        super().layout()
+        ui = self.ui
+        # Which seat was at the top of the view, to keep it there at the new size
+        top_seat = self.scroll // self.pitch * self.desks_per_row if self.scroll else 0
 
-        # Star
-        self.star_gamer_image = pygame.image.load('Images/Gamer_Star.png').convert_alpha()
-        self.star_gamer_image = pygame.transform.scale(self.star_gamer_image, (self.desk_width, self.desk_height))
+        # Door Button (invisible)
+        self.door_button = Button(*ui.pos(240, 24), 'Images/Door_Button.png', ui.size(170, 192),
+                                  "Images/Door_Button_on_Hover.png")
 
-        # Star
-        self.calm_gamer_image = pygame.image.load('Images/Gamer_Calm.png').convert_alpha()
-        self.calm_gamer_image = pygame.transform.scale(self.calm_gamer_image, (self.desk_width, self.desk_height))
+        # End Day Button
+        self.end_d_button = Button(*ui.pos(1375, 925), "Images/End_day_button1.png", ui.size(400, 125),
+                                   "Images/End_day_button2.png")
+        self.hover_grid.add(self.door_button)
+        self.hover_grid.add(self.end_d_button)
+
+        # The floor the desks sit on.  It scrolls and zooms, and only the seats
+        # inside it (and inside whatever is being redrawn) get blitted
+        left, top = ui.pos(self.horizontal_offset, self.vertical_offset)
+        self.view_rect = pygame.Rect(left, top, self.SCREEN_WIDTH - left, ui.px(self.floor_bottom) - top)
+        self.scrollbar_width = ui.px(10)
+
+        # Odds and hint, on the frame under the floor and left of the End Day button
+        self.odds_panel = pygame.Rect(ui.pos(150, 968), ui.size(1200, 104))
+        border = max(1, ui.px(4))
+        self.odds_panel_inside = self.odds_panel.inflate(-2 * border, -2 * border)
+
+        # Turns, COIN and REP
+        self.stat_positions = [ui.pos(1080, 15), ui.pos(1780, 15), ui.pos(1400, 15)]
+        self.hud_font = ui.font('Arial', 30)
+        self.set_zoom(self.zoom_level, top_seat)
 
     def draw(self):
         self.screen.blit(self.background, (0, 0))
+
+        clip = self.screen.get_clip()
+        self.screen.set_clip(clip.clip(self.view_rect))
         self.draw_desks()
         self.draw_gamer()
+        self.screen.set_clip(clip)
+
+        self.draw_scrollbar()
         self.end_d_button.draw(self.screen)
         self.door_button.draw(self.screen)
+        # Walkers come in through the door, above the view
+        self.draw_walkers()
         self.draw_stats()
+        self.draw_odds()
 
     def draw_stats(self):
-        turns = self.party.turns_remaining
-        coin = self.party.coin
-        rep = self.party.rep
-
-        turns_surface = self.font.render(f"{turns}", False, (0, 0, 0))
-        coin_surface = self.font.render(f"{coin}", False, (0, 0, 0))
-        rep_surface = self.font.render(f"{rep}", False, (0, 0, 0))
-
-        self.screen.blit(turns_surface, (1080, 15))
-        self.screen.blit(coin_surface, (1780, 15))
-        self.screen.blit(rep_surface, (1400, 15))
+        turns, coin, rep = self.shown_stats()
+
+        turns_surface = self.render_text(self.font, f"{turns}", False, (0, 0, 0))
+        coin_surface = self.render_text(self.font, f"{coin}", False, (0, 0, 0))
+        rep_surface = self.render_text(self.font, f"{rep}", False, (0, 0, 0))
+
+        turns_pos, coin_pos, rep_pos = self.stat_positions
+        self.screen.blit(turns_surface, turns_pos)
+        self.screen.blit(coin_surface, coin_pos)
+        self.screen.blit(rep_surface, rep_pos)
+
+    def stat_texts(self):
+        turns, coin, rep = self.shown_stats()
+        return list(zip((f"{turns}", f"{coin}", f"{rep}"), self.stat_positions))
+
+    @property
+    def animating(self):
+        return bool(self.walkers) or super().animating
+
+    def update(self, dt):
+        in_party = self.party.in_party
+        if in_party is not self.arrival_list:
+            # A new day, maybe with a door click in it already
+            self.arrival_list = in_party
+            self.arrived = 0
+            self.walkers = {}
+        if len(in_party) > self.arrived:
+            if len(in_party) - self.arrived <= self.max_walkers:
+                for seat in range(self.arrived, len(in_party)):
+                    self.walkers[seat] = Tween(self.walk_time)
+            self.arrived = len(in_party)
+
+        for seat, tween in list(self.walkers.items()):
+            tween.update(dt)
+            if tween.done:
+                del self.walkers[seat]
+                x, y = self.desk_position(seat)
+                self.invalidate(pygame.Rect(x, y + self.gamer_offset, self.desk_size, self.desk_size))
+
+    def walker_positions(self):
+        """(seat, x, y) of each walking gamer this frame."""
+        door_x = self.door_button.rect.centerx - self.desk_size // 2
+        door_y = self.door_button.rect.centery - self.desk_size // 2
+        positions = []
+        for seat, tween in self.walkers.items():
+            t = ease_out(tween.value(self.alpha))
+            x, y = self.desk_position(seat)
+            y += self.gamer_offset
+            positions.append((seat, round(door_x + (x - door_x) * t), round(door_y + (y - door_y) * t)))
+        return positions
+
+    def draw_walkers(self):
+        in_party = self.party.in_party
+        sprites = self.gamer_sprites
+        self.screen.blits([(sprites[in_party[seat].type_id], (x, y)) for seat, x, y in self.walker_positions()],
+                          doreturn=False)
+
+    def odds_texts(self):
+        if not self.show_odds:
+            return []
+        odds = self.odds.update()
+        lines = [f"Next gamer - Rage: {odds.rage:.0%}   Overflow: {odds.overflow:.0%}   4 Stars: {odds.win:.0%}",
+                 f"End day now: +{odds.bank_coin} COIN +{odds.bank_rep} REP"]
+        if not odds.exact:
+            lines[1] += " before abilities"
+        elif self.party.deck and self.party.desks - len(self.party.in_party) <= self.hint_max_seats:
+            hint = "open the door" if self.solver.should_open(self.party) else "end the day"
+            lines[1] += f"   Hint: {hint}"
+        return [(text, self.ui.pos(175, 978 + i * 44)) for i, text in enumerate(lines)]
+
+    def draw_odds(self):
+        texts = self.odds_texts()
+        if not texts:
+            return
+        # Two fills rather than draw.rect with a width, which puts its border on the edge of the clip
+        self.screen.fill((136, 75, 43), self.odds_panel)
+        self.screen.fill((231, 213, 179), self.odds_panel_inside)
+        for text, pos in texts:
+            self.screen.blit(self.render_text(self.hud_font, text, True, (0, 0, 0)), pos)
+
+    def set_zoom(self, level, top_seat=None):
+        """Switch to one of zoom_levels, keeping the top visible row's first desk (or top_seat) in view."""
+        level = max(0, min(level, len(self.zoom_levels) - 1))
+        if top_seat is None:
+            top_seat = self.scroll // self.pitch * self.desks_per_row
+        self.zoom_level = level
+        zoom = self.zoom_levels[level]
+
+        self.desk_size = max(1, self.ui.px(self.desk_width * zoom))
+        self.pitch = self.desk_size + self.ui.px(self.desk_spacing * zoom)
+        self.gamer_offset = self.ui.px(10 * zoom)
+        self.desks_per_row = max(1, (self.view_rect.width - self.scrollbar_width + self.pitch - self.desk_size)
+                                 // self.pitch)
+
+        # Images at this zoom, gamer sprites indexed by type id
+        self.desk_image = assets.image('Images/Desk.png', (self.desk_size, self.desk_size))
+        self.gamer_sprites = []
+        self.resolve_sprites()
+
+        self.scroll_to(top_seat // self.desks_per_row * self.pitch)
+        self.invalidate(self.view_rect)
+
+    def resolve_sprites(self):
+        """Scale the sprite of every gamer type interned since the last call."""
+        size = (self.desk_size, self.desk_size)
+        for path in type_sprites[len(self.gamer_sprites):]:
+            self.gamer_sprites.append(assets.image(path or self.default_sprite, size))
+
+    def max_scroll(self):
+        rows = -(-max(self.party.desks, len(self.party.in_party)) // self.desks_per_row)
+        content_height = (rows - 1) * self.pitch + self.desk_size + self.gamer_offset if rows else 0
+        return max(0, content_height - self.view_rect.height)
+
+    def scroll_to(self, scroll):
+        scroll = max(0, min(scroll, self.max_scroll()))
+        if scroll != self.scroll:
+            self.scroll = scroll
+            self.invalidate(self.view_rect)
+
+    def wheel(self, event):
+        if pygame.key.get_mods() & KMOD_CTRL:
+            self.set_zoom(self.zoom_level + (1 if event.y < 0 else -1))
+        else:
+            self.scroll_to(self.scroll - event.y * self.pitch)
+
+    def view_key(self, event):
+        page = max(self.pitch, self.view_rect.height - self.pitch)
+        if event.key == K_PAGEDOWN:
+            self.scroll_to(self.scroll + page)
+        elif event.key == K_PAGEUP:
+            self.scroll_to(self.scroll - page)
+        elif event.key == K_HOME:
+            self.scroll_to(0)
+        elif event.key == K_END:
+            self.scroll_to(self.max_scroll())
+        elif event.key in (K_EQUALS, K_PLUS, K_KP_PLUS):
+            self.set_zoom(self.zoom_level - 1)
+        elif event.key in (K_MINUS, K_KP_MINUS):
+            self.set_zoom(self.zoom_level + 1)
+
+    def desk_position(self, i):
+        row = i // self.desks_per_row
+        col = i % self.desks_per_row
+        x = col * self.pitch + self.view_rect.x
+        y = row * self.pitch + self.view_rect.y - self.scroll
+        return x, y
+
+    def visible_seats(self, count, area):
+        """(index, x, y) of the first count seats that overlap area and the view, in screen coordinates."""
+        view = self.view_rect
+        area = area.clip(view)
+        if not count or not area.width or not area.height:
+            return []
+
+        pitch = self.pitch
+        first_row = (area.top - view.top + self.scroll) // pitch
+        last_row = (area.bottom - 1 - view.top + self.scroll) // pitch
+        first_col = (area.left - view.left) // pitch
+        last_col = min(self.desks_per_row - 1, (area.right - 1 - view.left) // pitch)
+
+        seats = []
+        for row in range(first_row, last_row + 1):
+            start = row * self.desks_per_row
+            if start >= count:
+                break
+            y = view.top + row * pitch - self.scroll
+            for col in range(first_col, min(last_col + 1, count - start)):
+                seats.append((start + col, view.left + col * pitch, y))
+        return seats
+
+    def scrollbar_rect(self):
+        """The scrollbar thumb, or None when every desk fits in the view."""
+        max_scroll = self.max_scroll()
+        if not max_scroll:
+            return None
+        view = self.view_rect
+        height = max(30, view.height * view.height // (view.height + max_scroll))
+        y = view.top + (view.height - height) * self.scroll // max_scroll
+        return pygame.Rect(view.right - self.scrollbar_width, y, self.scrollbar_width, height)
+
+    def draw_scrollbar(self):
+        rect = self.scrollbar_rect()
+        if rect is not None:
+            pygame.draw.rect(self.screen, (40, 40, 40), rect, border_radius=self.scrollbar_width // 2)
+
+    def check_dirty(self):
+        # Stats and odds: redraw where the old and the new text sit
+        stats = self.stat_texts()
+        if stats != self.drawn_stats:
+            self.invalidate_texts(self.drawn_stats, stats, self.font)
+            self.drawn_stats = stats
+
+        odds = self.odds_texts()
+        if odds != self.drawn_odds:
+            self.invalidate_texts(self.drawn_odds, odds, self.hud_font)
+            # The panel comes and goes with show_odds
+            if bool(odds) != bool(self.drawn_odds):
+                self.invalidate(self.odds_panel)
+            self.drawn_odds = odds
+
+        # Desks bought since the last frame, only the visible ones need drawing
+        desks = self.party.desks
+        if desks != self.drawn_desks:
+            changed_from = min(desks, self.drawn_desks)
+            for i, x, y in self.visible_seats(max(desks, self.drawn_desks), self.view_rect):
+                if i >= changed_from:
+                    self.invalidate(pygame.Rect(x, y, self.desk_size, self.desk_size))
+            self.drawn_desks = desks
+
+        # Seats whose gamer arrived or left.  in_party only gets appended to
+        # during a day and replaced at the end of one, so this stays O(1) per frame
+        gamers = self.party.in_party
+        count = self.drawn_gamer_count
+        if gamers is not self.drawn_gamers or len(gamers) != count:
+            changed_from = count if gamers is self.drawn_gamers and len(gamers) > count else 0
+            for i, x, y in self.visible_seats(max(len(gamers), count), self.view_rect):
+                if i >= changed_from:
+                    self.invalidate(pygame.Rect(x, y + self.gamer_offset, self.desk_size, self.desk_size))
+            self.drawn_gamers = gamers
+            self.drawn_gamer_count = len(gamers)
+
+        scrollbar = self.scrollbar_rect()
+        if scrollbar != self.drawn_scrollbar:
+            for rect in (scrollbar, self.drawn_scrollbar):
+                if rect is not None:
+                    self.invalidate(rect)
+            self.drawn_scrollbar = scrollbar
+
+        # Walking gamers: where they were drawn and where they are now
+        if self.walkers or self.drawn_walkers:
+            walkers = [pygame.Rect(x, y, self.desk_size, self.desk_size) for _, x, y in self.walker_positions()]
+            for rect in self.drawn_walkers + walkers:
+                self.invalidate(rect)
+            self.drawn_walkers = walkers
 
     def draw_desks(self):
-        num_desks = self.party.desks
-        for i in range(num_desks):
-            # Calculate row and column
-            row = i // self.desks_per_row
-            col = i % self.desks_per_row
-
-            # Calculate position with offsets
-            x = col * (self.desk_width + self.desk_spacing) + self.horizontal_offset
-            y = row * (self.desk_height + self.desk_spacing) + self.vertical_offset
-
-            # Draw desk
-            self.screen.blit(self.desk_image, (x, y))
+        # Only the desks inside the clip, which draw() has narrowed to the view
+        image = self.desk_image
+        seats = self.visible_seats(self.party.desks, self.screen.get_clip())
+        self.screen.blits([(image, (x, y)) for _, x, y in seats], doreturn=False)
 
     def draw_gamer(self):
-        for i, gamer in enumerate(self.party.in_party):
-            # Calculate row and column
-            row = i // self.desks_per_row
-            col = i % self.desks_per_row
-
-            x = col * (self.desk_width + self.desk_spacing) + self.horizontal_offset
-            y = row * (self.desk_height + self.desk_spacing) + self.vertical_offset
-
-            # Adjust gamer position to center on the desk
-            gamer_x = x
-            gamer_y = y + 10
-
-            # Determine the correct image based on gamer type
-            if gamer.name == 'Normal Gamer':
-                image = self.normal_gamer_image
-            elif gamer.name == 'Rich Gamer':
-                image = self.rich_gamer_image
-            elif gamer.name == 'Angry Gamer':
-                image = self.angry_gamer_image
-            elif gamer.name == 'Star Gamer':
-                image = self.star_gamer_image
-            elif gamer.name == 'Calm Gamer':
-                image = self.calm_gamer_image
-            else:
-                image = self.normal_gamer_image  # Fallback in case of unknown type
-
-            # Draw gamer image
-            self.screen.blit(image, (gamer_x, gamer_y))
+        in_party = self.party.in_party
+        if len(self.gamer_sprites) < len(type_names):
+            self.resolve_sprites()
+        sprites = self.gamer_sprites
+        offset = self.gamer_offset  # Sit the gamer a little lower than the desk
+        # Gamers still on their way (or about to be) aren't at their desk yet
+        seated = self.arrived if in_party is self.arrival_list else len(in_party)
+        walkers = self.walkers
+        seats = self.visible_seats(seated, self.screen.get_clip())
+        self.screen.blits([(sprites[in_party[i].type_id], (x, y + offset)) for i, x, y in seats
+                           if i not in walkers], doreturn=False)
 
     def play_music(self):
-        pygame.mixer.init()
-        pygame.mixer.music.load('Sounds/dark.wav')  # Replace with your music file path
-        pygame.mixer.music.set_volume(0.1)  # Set volume (0.0 to 1.0)
-        pygame.mixer.music.play(-1)  # Loop the music (-1 means infinite loop)
+        audio.play_track('Sounds/dark.wav', 0.1)
 
 
 class ShopScreen(Screen, ABC):
+    background_path = 'Images/Shop.png'
+    profiled = Screen.profiled + ("draw_stats",)
+    desk_image = 'Images/Desk.png'
+    images = [('Images/Next_Day_Button1.png', (400, 125), True),
+              ('Images/Next_Day_Button2.png', (400, 125), True)]
+    images += [(path, (150, 150), True) for path in [desk_image] + [path for path in type_sprites if path]]
+
     def __init__(self, screen, party):
-        super().__init__(screen)
         self.party = party
-        self.background = pygame.image.load('Images/Shop.png').convert_alpha()
-        self.background = pygame.transform.scale(self.background, (1920, 1080))
+
+        # Shop Items (Desks and Gamers) stocked by the party's config, prices come from Party.price.
+        # Gamers are shown with their type's sprite
+        config = party.config
+        self.items = [{"name": name, "image": self.desk_image if name == "New Desk" else
+                       config.new_gamer(name).sprite or BasementScreen.default_sprite}
+                      for name in config.shop_items if name == "New Desk" or name in config.gamer_stats]
+
+        # Positioning adjustments, logical
+        self.grid_start_x = 150  # Shift the grid to the right
+        self.grid_start_y = 260  # Shift the grid down
+        self.button_padding = 300  # Space between buttons
+        super().__init__(screen)
+
+        # Stats and prices on screen last frame, for check_dirty
+        self.drawn_stats = None
+        self.drawn_costs = None
+
+    def layout(self):
+        super().layout()
+        ui = self.ui
 
         # Fonts for stats
-        self.stats_font = pygame.font.SysFont('Arial', 80)
+        self.stats_font = ui.font('Arial', 80)
 
         # Next Day Button
-        self.next_d_button = Button(1340, 900, "Images/Next_Day_Button1.png", (400, 125), "Images/Next_Day_Button2.png")
+        self.next_d_button = Button(*ui.pos(1340, 900), "Images/Next_Day_Button1.png", ui.size(400, 125),
+                                    "Images/Next_Day_Button2.png")
 
         # Font for labels
-        self.font = pygame.font.SysFont('Arial', 30)
-
-        # Shop Items (Desks and Gamers)
-        self.items = [
-            {"name": "New Desk", "cost": 5, "currency": "coin", "image": 'Images/Desk.png',
-             "action": self.upgrade_desk},
-            {"name": "Rich Gamer", "cost": 10, "currency": "rep", "image": 'Images/Gamer_Rich.png',
-             "action": self.add_rich_gamer},
-            {"name": "Angry Gamer", "cost": 8, "currency": "rep", "image": 'Images/Gamer_Angry.png',
-             "action": self.add_angry_gamer},
-            {"name": "Normal Gamer", "cost": 5, "currency": "rep", "image": 'Images/Gamer.png',
-             "action": self.add_normal_gamer},
-            {"name": "Star Gamer", "cost": 25, "currency": "rep", "image": 'Images/Gamer_Star.png',
-             "action": self.add_star_gamer},
-            {"name": "Calm Gamer", "cost": 15, "currency": "rep", "image": 'Images/Gamer_Calm.png',
-             "action": self.add_calm_gamer},
-        ]
-
-        # Positioning adjustments
-        self.grid_start_x = 150  # Shift the grid to the right
-        self.grid_start_y = 260  # Shift the grid down
-        self.button_width = 150  # Width of each button
-        self.button_height = 150  # Height of each button
-        self.button_padding = 300  # Space between buttons
+        self.font = ui.font('Arial', 30)
+
+        # Size of each button, in pixels
+        self.button_width, self.button_height = ui.size(150, 150)
 
         # Item Buttons
         self.item_buttons = []
         for i, item in enumerate(self.items):
-            x = self.grid_start_x + (i % 3) * (self.button_width + self.button_padding)
-            y = self.grid_start_y + (i // 3) * (self.button_height + self.button_padding)
+            x = ui.px(self.grid_start_x + (i % 3) * (150 + self.button_padding))
+            y = ui.px(self.grid_start_y + (i // 3) * (150 + self.button_padding))
             button = Button(x, y, item["image"], scale=(self.button_width, self.button_height))
             self.item_buttons.append({"button": button, "item": item})
 
+        self.hover_grid.add(self.next_d_button)
+        self.items_by_button = {}
+        for item_button in self.item_buttons:
+            self.hover_grid.add(item_button["button"])
+            self.items_by_button[item_button["button"]] = item_button["item"]
+
+        # Turns, COIN and REP
+        self.stat_positions = [ui.pos(1740, 180), ui.pos(1740, 360), ui.pos(1740, 270)]
+
     def draw(self):
         # Draw background
         self.screen.blit(self.background, (0, 0))
@@ -252,109 +812,106 @@ class ShopScreen(Screen, ABC):
             item_button["button"].draw(self.screen)
 
             # Render item name
-            name_surface = self.font.render(item_button["item"]["name"], True, (0, 0, 0))
+            name_surface = self.render_text(self.font, item_button["item"]["name"], True, (0, 0, 0))
             x, y = item_button["button"].rect.topleft
 
             # Adjust name position above the button
             name_x = x + (self.button_width // 2) - (name_surface.get_width() // 2)
-            name_y = y - 50
+            name_y = y - self.ui.px(50)
 
             self.screen.blit(name_surface, (name_x, name_y))
 
-            # Render item cost
-            cost_surface = self.font.render(
-                f"Cost: {item_button['item']['cost']} {item_button['item']['currency'].capitalize()}",
-                True, (0, 0, 0)
-            )
-            cost_x = x + (self.button_width // 2) - (cost_surface.get_width() // 2)
-            cost_y = y + self.button_height + 10
-
-            self.screen.blit(cost_surface, (cost_x, cost_y))
+        # Render item costs under the buttons
+        for text, pos in self.cost_texts():
+            self.screen.blit(self.render_text(self.font, text, True, (0, 0, 0)), pos)
 
         # Draw next day button
         self.next_d_button.draw(self.screen)
 
-    def draw_stats(self):
-        turns = self.party.turns_remaining
-        coin = self.party.coin
-        rep = self.party.rep
+    def stat_texts(self):
+        turns, coin, rep = self.shown_stats()
+        return list(zip((f"{turns}", f"{coin}", f"{rep}"), self.stat_positions))
 
-        turns_surface = self.stats_font.render(f"{turns}", True, (0, 0, 0))
-        coin_surface = self.stats_font.render(f"{coin}", True, (0, 0, 0))
-        rep_surface = self.stats_font.render(f"{rep}", True, (0, 0, 0))
-
-        # Draw stats on the screen
-        self.screen.blit(turns_surface, (1740, 180))
-        self.screen.blit(coin_surface, (1740, 360))
-        self.screen.blit(rep_surface, (1740, 270))
-
-    def upgrade_desk(self):
-        self.party.upgrade_desk()
-
-    def add_rich_gamer(self):
-        self.party.deck.append(Gamer("Rich Gamer", rep=2, coin=1, rage=0))
-
-    def add_angry_gamer(self):
-        self.party.deck.append(Gamer("Angry Gamer", rep=2, coin=0, rage=1))
+    def cost_texts(self):
+        texts = []
+        for item_button in self.item_buttons:
+            name = item_button["item"]["name"]
+            cost, currency = self.party.price(name)
+            text = f"Cost: {cost} {currency.capitalize()}"
+            if name == "New Desk" and self.party.desk_cost > cost:
+                # Party.upgrade_desk won't sell one unless desk_cost is in hand
+                text += f", needs {self.party.desk_cost}"
+            x, y = item_button["button"].rect.topleft
+            cost_x = x + (self.button_width // 2) - (self.font.size(text)[0] // 2)
+            cost_y = y + self.button_height + self.ui.px(10)
+            texts.append((text, (cost_x, cost_y)))
+        return texts
+
+    def check_dirty(self):
+        stats = self.stat_texts()
+        if stats != self.drawn_stats:
+            self.invalidate_texts(self.drawn_stats, stats, self.stats_font)
+            self.drawn_stats = stats
+
+        # The desk gets pricier with each one bought
+        costs = self.cost_texts()
+        if costs != self.drawn_costs:
+            self.invalidate_texts(self.drawn_costs, costs, self.font)
+            self.drawn_costs = costs
 
-    def add_normal_gamer(self):
-        self.party.deck.append(Gamer("Normal Gamer", rep=1, coin=0, rage=0))
+    def draw_stats(self):
+        turns, coin, rep = self.shown_stats()
 
-    def add_star_gamer(self):
-        self.party.deck.append(Gamer("Star Gamer", rep=5, coin=2, rage=0, star=1))
+        turns_surface = self.render_text(self.stats_font, f"{turns}", True, (0, 0, 0))
+        coin_surface = self.render_text(self.stats_font, f"{coin}", True, (0, 0, 0))
+        rep_surface = self.render_text(self.stats_font, f"{rep}", True, (0, 0, 0))
 
-    def add_calm_gamer(self):
-        self.party.deck.append(Gamer(name="Calm Gamer", rep=1, coin=0, rage=-1))
+        # Draw stats on the screen
+        turns_pos, coin_pos, rep_pos = self.stat_positions
+        self.screen.blit(turns_surface, turns_pos)
+        self.screen.blit(coin_surface, coin_pos)
+        self.screen.blit(rep_surface, rep_pos)
 
     def play_music(self):
-        pygame.mixer.init()
-        pygame.mixer.music.load('Sounds/dope.wav')
-        pygame.mixer.music.set_volume(0.05)  # Set volume (0.0 to 1.0)
-        pygame.mixer.music.play(-1)  # Loop the music (-1 means infinite loop)
+        audio.play_track('Sounds/dope.wav', 0.05)
 
 
 class WinScreen(Screen, ABC):
+    background_path = 'Images/Win_Screen.png'
+
     def __init__(self, screen):
         super().__init__(screen)
-        self.background = self.shop_background = pygame.image.load('Images/Win_Screen.png').convert_alpha()
-        self.background = pygame.transform.scale(self.background, (1920, 1080))
 
     def draw(self):
         self.screen.blit(self.background, (0, 0))
 
     def play_music(self):
-        pygame.mixer.init()
-        pygame.mixer.music.load('Sounds/money.wav')
-        pygame.mixer.music.set_volume(0.1)  # Set volume (0.0 to 1.0)
-        pygame.mixer.music.play(-1)  # Loop the music (-1 means infinite loop)
+        audio.play_track('Sounds/money.wav', 0.1)
 
 
 class RageScreen(Screen, ABC):
+    background_path = 'Images/Rage_Screen.png'
+
     def __init__(self, screen):
         super().__init__(screen)
-        self.background = self.shop_background = pygame.image.load('Images/Rage_Screen.png').convert_alpha()
-        self.background = pygame.transform.scale(self.background, (1920, 1080))
 
     def draw(self):
         self.screen.blit(self.background, (0, 0))
         self.enter_to_continue()
 
     def play_music(self):
-        pygame.mixer.init()
-        pygame.mixer.music.load('Sounds/drone synth1.wav')
-        pygame.mixer.music.set_volume(0.1)  # Set volume (0.0 to 1.0)
-        pygame.mixer.music.play(-1)  # Loop the music (-1 means infinite loop)
+        audio.play_track('Sounds/drone synth1.wav', 0.1)
 
     def enter_to_continue(self):
-        text = self.font.render(f"Press enter to continue", False, (255, 255, 255))
+        text = self.render_text(self.font, f"Press enter to continue", False, (255, 255, 255))
         self.screen.blit(text, (0, 0))
 
 
 class OverFlowScreen(RageScreen):
+    background_path = 'Images/Overflow_Screen.png'
+
     def __init__(self, screen):
         super().__init__(screen)
-        self.background = self.shop_background = pygame.image.load('Images/Overflow_Screen.png').convert_alpha()
-        self.background = pygame.transform.scale(self.background, (1920, 1080))
 
     def draw(self):
         self.screen.blit(self.background, (0, 0))
@@ -362,245 +919,447 @@ class OverFlowScreen(RageScreen):
 
 
 class GameState:
-    def __init__(self):
+    def __init__(self, dirty_rendering=True, report_startup=False, fps=60, power_saving=True, config=None,
+                 seed=None, record=None, verbose=True, client=None, save=None, resume=None, update_rate=120,
+                 size=(1920, 1080), fullscreen=False, render_scale=1.0):
+        # (phase, seconds) of everything __init__ does, see startup_report()
+        self.startup_timings = []
+        start = phase_start = time.perf_counter()
+
         # initialize pygame
         pygame.init()
         pygame.display.set_caption('Lan Party')
 
+        # The screens draw on a canvas, the largest 16:9 area of the window
+        # times render_scale.  Below 1 they draw fewer pixels and the canvas
+        # gets scaled up to the window, for GPUs that can't keep up
+        self.window_size = tuple(size)
+        self.fullscreen = fullscreen
+        self.render_scale = min(1.0, render_scale)
+        window_size = pygame.display.get_desktop_sizes()[0] if fullscreen else self.window_size
+        self.preload(Layout(canvas_size(window_size, self.render_scale)))
+        phase_start = self.time_startup("pygame.init", phase_start)
+
         # Screen settings
-        self.screen = pygame.display.set_mode((1920, 1080))
+        self.window = self.open_window()
+        self.viewport = Viewport(self.window, canvas_size(self.window.get_size(), self.render_scale))
+        self.screen = self.viewport.canvas
         pygame.display.set_caption('Lan Party')
         icon_image = pygame.image.load('Images/Logo.png')
         pygame.display.set_icon(icon_image)
-
-        # Screens
-        self.party = Party()
+        phase_start = self.time_startup("display", phase_start)
+
+        # A save that can't be read is reported and a new game started instead
+        session = None
+        if resume is not None and client is None:
+            try:
+                session = load_save(resume, verbose)
+            except (OSError, ValueError) as error:
+                print(f"Couldn't resume {resume}, starting a new game: {error}")
+
+        # Screens.  The party's seed goes in recordings so a game can be replayed
+        self.client = client
+        if client is not None:
+            # Connected to a lan_party_net server, which plays the game; this
+            # party only mirrors what it sends
+            self.party = client.mirror.party
+            self.session = client.mirror.session
+            self.recorder = None
+        elif session is not None:
+            # A recording has to start from the first day, so a resumed game isn't recorded
+            self.session = session
+            self.party = self.session.party
+            self.recorder = None
+            if verbose:
+                print(f"Resumed {resume}")
+        else:
+            if seed is None:
+                seed = random.SystemRandom().randrange(1 << 32)
+            self.party = Party(config=config, seed=seed, verbose=verbose)
+            self.session = Session(self.party)
+            self.recorder = Recorder(record, self.party) if record else None
+            if verbose:
+                print(f"Seed: {seed}")
+        # Saved (off this thread) whenever a day ends and on quit, see play_input().
+        # Quitting before anything was played leaves the save alone, so starting
+        # without --resume and quitting from the title screen can't wipe it
+        self.autosaver = Autosaver(save, verbose) if save and client is None else None
+        self.saved_turns = self.party.turns_remaining
+        self.played = False
         self.title_screen = TitleScreen(self.screen, self.party)
         self.party_screen = BasementScreen(self.screen, self.party)
         self.shop_screen = ShopScreen(self.screen, self.party)
         self.rage_screen = RageScreen(self.screen)
         self.overflow_screen = OverFlowScreen(self.screen)
-        self.current_screen = self.title_screen
-        self.cash_sound = pygame.mixer.Sound('Sounds/cash.mp3')
-        self.cash_sound.set_volume(0.1)
+        self.current_screen = self.title_screen if session is None else None
+        audio.preload(['Sounds/cash.mp3'])
         self.win_screen = WinScreen(self.screen)
-
-        # Shared assets
-        self.clock = pygame.time.Clock()
+        self.screens = {"title": self.title_screen, "basement": self.party_screen, "shop": self.shop_screen,
+                        "rage": self.rage_screen, "overflow": self.overflow_screen, "win": self.win_screen}
+        if self.current_screen is None:
+            self.current_screen = self.screens[self.session.screen]
+
+        # COIN and REP count up on the basement and shop screens
+        self.counters = StatCounters(self.party)
+        self.party_screen.counters = self.counters
+        self.shop_screen.counters = self.counters
+        phase_start = self.time_startup("screens and sounds", phase_start)
+
+        # The title is drawn straight away, the other backgrounds load on first use
+        self.title_screen.background
+        phase_start = self.time_startup("title background", phase_start)
+
+        # Frame pacing: capped at fps, asleep on static screens when power saving
+        self.frames = FrameScheduler(fps, power_saving)
+
+        # Only redraw and push the parts of the screen that changed
+        self.dirty_rendering = dirty_rendering
+
+        # While the window is being resized the old canvas is scaled to fit, the
+        # screens are only laid out again once it's been resize_delay seconds
+        # since the last resize.  Dragging a window edge doesn't scale every
+        # image for every size it passes through
+        self.resize_delay = 0.2
+        self.resized_at = None
+
+        # Animations advance in fixed steps of update_step seconds, however
+        # often frames get drawn.  A slow frame runs several steps before it
+        # draws, so gameplay keeps its pace and frames get skipped instead.
+        # Longer gaps than max_frame_time (a stall, a sleep while idle) are cut short
+        self.update_step = 1 / update_rate
+        self.max_frame_time = 0.25
+
+        # Profiler overlay (F3), refreshed a few times a second so it stays readable
+        self.overlay_font = pygame.font.SysFont('Consolas', 20)
+        self.overlay = None
+        self.overlay_time = 0.0
+        self.overlay_rect = None
+
+        # Event handlers per screen, see register_handlers()
+        self.running = False
+        self.register_handlers()
+
+        # Catch up with whatever the server sent while all this was loading
+        if client is not None:
+            client.on_update = lambda: pygame.event.post(pygame.event.Event(NETWORK_UPDATE))
+            self.sync()
 
         # Play music for the starting screen
         self.current_screen.play_music()
+        self.time_startup("music", phase_start)
+        self.startup_timings.append(("total", time.perf_counter() - start))
 
-    def purchase_shop_item(self, item):
-        currency = item["currency"]
-        cost = item["cost"]
-
-        # Check if the player has enough currency
-        if getattr(self.party, currency) >= cost:
-            # Perform the item's action
-            action_result = item["action"]()
-
-            # Only deduct cost if the action doesn't handle it
-            if action_result is None or action_result is True:  # Assume success if no return value
-                if action_result is None:  # Action like adding gamers doesn't deduct coins
-                    setattr(self.party, currency, getattr(self.party, currency) - cost)  # Deduct currency
-                print(f"Purchased {item['name']}!")
-                self.cash_sound.play()  # Play cash sound on success
-            else:
-                print(f"Failed to purchase {item['name']}!")
-        else:
-            print(f"Not enough {currency} to purchase {item['name']}!")
-
-    def run(self):
-        running = True
-
-        while running:
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    running = False
-
-                # Handles Title Screen Actions
-                if isinstance(self.current_screen, TitleScreen):
-                    if event.type == KEYDOWN:
-                        if event.key == K_RETURN:
-                            self.current_screen = self.party_screen
-                            self.current_screen.play_music()
-                            self.party.start_day()
-                            print(self.party.deck)
-                        elif event.key == K_ESCAPE:
-                            running = False
-
-                # Basement Screen
-                if isinstance(self.current_screen, BasementScreen):
-                    if event.type == KEYDOWN:
-                        if event.key == K_ESCAPE:
-                            running = False
-                    elif self.current_screen.end_d_button.is_clicked(event):
-                        self.party.end_day()
-                        self.current_screen = self.shop_screen
-                        self.current_screen.play_music()
-                        break
-                    elif event.type == MOUSEMOTION:
-                        self.current_screen.door_button.update_hover(event.pos)
-                        self.current_screen.end_d_button.update_hover(event.pos)
-                    elif self.current_screen.door_button.is_clicked(event):
-                        self.party.let_in_party(self)
-
-                # Raged or Overflow Screen
-                if isinstance(self.current_screen, (RageScreen, OverFlowScreen)):
-                    if event.type == KEYDOWN:
-                        if event.key == K_RETURN:
-                            self.current_screen = self.shop_screen
-                            self.current_screen.play_music()
-
-                # Shop Screen
-                if isinstance(self.current_screen, ShopScreen):
-                    if event.type == KEYDOWN:
-                        if event.key == K_ESCAPE:
-                            running = False
-                    elif self.current_screen.next_d_button.is_clicked(event):
-                        self.current_screen = self.party_screen
-                        self.current_screen.play_music()
-                        self.party.start_day()
-                        break
-                    elif event.type == MOUSEBUTTONUP:
-                        for item_button in self.current_screen.item_buttons:
-                            if item_button["button"].is_clicked(event):
-                                self.purchase_shop_item(item_button["item"])
-                    elif event.type == MOUSEMOTION:
-                        self.current_screen.next_d_button.update_hover(event.pos)
-                        for item_button in self.current_screen.item_buttons:
-                            item_button["button"].update_hover(event.pos)
-
-            # Render the current screen
-            self.current_screen.draw()
+        if report_startup:
+            print(self.startup_report())
 
-            # Update the display
-            pygame.display.flip()
-
-            self.clock.tick(60)
-
-
-class Gamer:
-    def __init__(self, name, rep=0, coin=0, rage=0, ability=None, cost=1, star=False):
-        self.name = name
-        self.rep = rep
-        self.coin = coin
-        self.rage = rage
-        self.ability = ability
-        self.cost = cost
-        self.star = star
-
-    def __str__(self):
-        return (f"I am a {self.name},"
-                f" I give {self.rep}REP and {self.coin}COIN"
-                f"I give {self.rage} RAGE"
-                f"I have this ability:{self.ability}"
-                f"I cost {self.cost}")
-
-    def __repr__(self):
-        return f"Gamer({self.name}, {self.rep}, {self.coin}, {self.rage}, {self.ability}, {self.cost})"
-
-    def use_ability(self, party):
-        if self.ability:
-            self.ability(party)
-
-
-class Party:
-    def __init__(self):
-        self.deck = [
-            Gamer("Normal Gamer", 1, 0, 0, None, 0, 0),
-            Gamer("Normal Gamer", 1, 0, 0, None, 0, 0),
-            Gamer("Normal Gamer", 1, 0, 0, None, 0, 0),
-            Gamer("Angry Gamer", 2, 0, 1, None, 0, 0),
-            Gamer("Angry Gamer", 2, 0, 1, None, 0, 0),
-            Gamer("Angry Gamer", 2, 0, 1, None, 0, 0),
-        ]
-        self.in_party = []
-        self.desks = 5
-        self.coin = 0
-        self.rage_level = 0
-        self.star_level = 0
-        self.rep = 0
-        self.turns_remaining = 25
-        self.desk_cost = 5
-
-    def upgrade_desk(self):
-        if self.coin >= self.desk_cost:
-            self.desks += 1
-            self.desk_cost += 2
-            print(f"Desk upgraded! Total desks: {self.desks}, Remaining coins: {self.coin}")
-            return True
-        else:
-            print("Not enough coins to upgrade desk!")
+    @staticmethod
+    def preload(ui):
+        """Start decoding images at ui's scale in the background: the title, what
+        the screens need to be built, then the backgrounds shown later."""
+        screen_classes = (TitleScreen, BasementScreen, ShopScreen, RageScreen, OverFlowScreen, WinScreen)
+        assets.preload([(TitleScreen.background_path, ui.canvas_size, TitleScreen.background_alpha)])
+        for screen_class in screen_classes:
+            assets.preload(ui.images(screen_class.images))
+        assets.preload([(screen_class.background_path, ui.canvas_size, screen_class.background_alpha)
+                        for screen_class in screen_classes])
+
+    def open_window(self):
+        if self.fullscreen:
+            return pygame.display.set_mode((0, 0), FULLSCREEN)
+        return pygame.display.set_mode(self.window_size, RESIZABLE)
+
+    def set_viewport(self, viewport):
+        """Show the screens through a new viewport, laying them out again if its canvas is a new size."""
+        self.viewport = viewport
+        self.screen = viewport.canvas
+        for screen in self.screens.values():
+            screen.resize(self.screen)
+        self.overlay_rect = None
+
+    def fit_canvas(self):
+        """Draw at the size the window calls for.  Images come from the asset cache
+        if the window has been this size before."""
+        size = canvas_size(self.window.get_size(), self.render_scale)
+        if size != self.screen.get_size():
+            self.preload(Layout(size))
+        self.set_viewport(Viewport(self.window, size))
+
+    def window_resized(self, event):
+        if not self.fullscreen:
+            self.window_size = event.size
+        # The display surface is a new size, so the canvas can't be part of it
+        # any more.  Keep drawing at the old size until fit_canvas()
+        self.window = pygame.display.get_surface()
+        self.set_viewport(Viewport(self.window, self.screen.get_size()))
+        self.resized_at = time.perf_counter()
+
+    def window_exposed(self, event):
+        self.viewport.bars_drawn = False
+        self.current_screen.invalidate()
+
+    def display_key(self, event):
+        if event.key == K_F11:
+            self.fullscreen = not self.fullscreen
+            self.window = self.open_window()
+            self.fit_canvas()
+
+    def time_startup(self, phase, phase_start):
+        now = time.perf_counter()
+        self.startup_timings.append((phase, now - phase_start))
+        return now
+
+    def startup_report(self):
+        lines = ["STARTUP REPORT\n--------------"]
+        lines += [f"{phase:<18}{seconds * 1000:8.1f}ms" for phase, seconds in self.startup_timings]
+        lines.append(assets.report())
+        return "\n".join(lines)
+
+    def play_input(self, action, arg=0):
+        """Play an input through the session, record it and show the screen it leads to."""
+        if self.client is not None:
+            # The server plays it, sync() shows what it did
+            self.client.send(action, arg)
             return False
+        if not self.session.play(action, arg):
+            return False
+        self.played = True
+        if self.recorder is not None:
+            self.recorder.record(action, arg)
+        if self.autosaver is not None and self.party.turns_remaining != self.saved_turns:
+            self.saved_turns = self.party.turns_remaining
+            self.autosaver.save(self.session)
+
+        screen = self.screens[self.session.screen]
+        if screen is not self.current_screen:
+            self.switch_screen(screen)
+        return True
 
-    def start_day(self):
-        # Shuffles cards and signals a new day has started
-        self.shuffle_gamers()
-
-    def end_day(self, raged=False, over_flow=False, win=False):
-        if raged:
-            print(f"Raged to hard mom ended the party")
-
-        elif over_flow:
-            print("You overflowed! Mom ended the party!")
-
-        elif win:
-            print("You win!")
-
-        else:
-            for gamer in self.in_party:
-                self.coin += gamer.coin
-                self.rep += gamer.rep
-
-        # Refills deck
-        self.deck.extend(self.in_party)
-
-        # Clears the in party list for next day
-        self.in_party = []
-
-        # Sets turn count
-        self.turns_remaining -= 1
-
-        # Resets rage level
-        self.rage_level = 0
-
-        self.star_level = 0
-
-        print(f"\nEND OF DAY REPORT\n----------------\n\n"
-              f"COIN: {self.coin}\nREP: {self.rep}\nTurns remaining:{self.turns_remaining}\n rage:{self.rage_level}")
+    def purchase_shop_item(self, item):
+        # Party.buy checks the price and says why if it can't be paid
+        if self.play_input(BUY, self.session.shop_items.index(item["name"])):
+            if self.party.verbose:
+                print(f"Purchased {item['name']}!")
+            audio.play_effect('Sounds/cash.mp3', 0.1)  # Play cash sound on success
+
+    def update(self, dt):
+        """One fixed step of every animation."""
+        self.counters.update(dt)
+        self.current_screen.update(dt)
+
+    def settle(self, seconds=5.0):
+        """Run fixed updates until nothing is animating, for drawing single frames (replay screenshots)."""
+        # The first step is what notices anything new to animate
+        self.update(self.update_step)
+        steps = 1
+        while self.current_screen.animating and steps * self.update_step < seconds:
+            self.update(self.update_step)
+            steps += 1
+        self.current_screen.alpha = 1.0
+
+    def sync(self, event=None):
+        """Apply the updates the server has sent and show the screen it says we're on."""
+        if self.client is None:
+            return
+        acked, accepted = self.client.poll()
+        if acked and acked[-1] == BUY and accepted:
+            audio.play_effect('Sounds/cash.mp3', 0.1)
+        if self.client.error is not None:
+            print(f"Lost the server: {self.client.error}")
+            self.quit()
+            return
 
-    def let_in_party(self, game_state):
-        # Draw the next gamer
-        next_gamer = self.deck.pop(0)
+        screen = self.screens[self.session.screen]
+        if screen is not self.current_screen:
+            self.switch_screen(screen)
 
-        # Add to the party
-        self.in_party.append(next_gamer)
-        print(f"You've let {next_gamer.name} into the party!")
-        print(f"Current party members: {len(self.in_party)}")
+    def switch_screen(self, screen):
+        self.current_screen = screen
+        self.current_screen.invalidate()
+        self.current_screen.play_music()
 
-        # adds gamers rage to rage_level
-        self.rage_level += next_gamer.rage
-        self.star_level += next_gamer.star
-        print(self.rage_level)
-        # Check for the party-ending rage condition
-        if len(self.in_party) > self.desks:
-            self.end_day(over_flow=True)
-            game_state.current_screen = game_state.overflow_screen
-            game_state.current_screen.play_music()
+    def register_handlers(self):
+        # Events every screen reacts to
+        self.handlers = {
+            QUIT: [self.quit],
+            WINDOWEXPOSED: [self.window_exposed],
+            VIDEORESIZE: [self.window_resized],
+            KEYDOWN: [self.profiler_key, self.display_key],
+        }
+        if self.client is not None:
+            self.handlers[NETWORK_UPDATE] = [self.sync]
+
+        self.title_screen.on(KEYDOWN, self.title_key)
+        self.party_screen.on(KEYDOWN, self.escape_key)
+        self.party_screen.on(MOUSEBUTTONUP, self.basement_click)
+        self.rage_screen.on(KEYDOWN, self.continue_key)
+        self.overflow_screen.on(KEYDOWN, self.continue_key)
+        self.shop_screen.on(KEYDOWN, self.escape_key)
+        self.shop_screen.on(MOUSEBUTTONUP, self.shop_click)
+
+        # Keep everything nobody handles out of the SDL queue
+        screens = (self.title_screen, self.party_screen, self.shop_screen,
+                   self.rage_screen, self.overflow_screen, self.win_screen)
+        allowed = set(self.handlers)
+        for screen in screens:
+            allowed.update(screen.handlers)
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(sorted(allowed))
+
+    def quit(self, event=None):
+        self.running = False
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        if self.autosaver is not None:
+            if self.played:
+                self.autosaver.save(self.session)
+            self.autosaver.close()
+            self.autosaver = None
+
+    def profiler_key(self, event):
+        if event.key == K_F3:
+            profiler.toggle(self.screens.values())
+            if self.overlay_rect is not None:
+                self.current_screen.invalidate(self.overlay_rect)
+                self.overlay_rect = None
+            self.overlay = None
+        elif event.key == K_F4 and profiler.count:
+            os.makedirs('.traces', exist_ok=True)
+            path = os.path.join('.traces', time.strftime('trace_%Y%m%d_%H%M%S.json'))
+            print(f"Saved {profiler.export_chrome(path)} samples to {path}")
+
+    def draw_profiler(self):
+        """Blit the FPS and per-frame timings in the corner, returns where."""
+        now = time.perf_counter()
+        if self.overlay is None or now - self.overlay_time > 0.25:
+            fps, rows = profiler.summary()
+            lines = [f"FPS {fps:.1f}  (F3 hide, F4 save trace)"]
+            lines += [f"{'  ' * depth}{name}: {ms:.3f}ms" for name, depth, ms in rows]
+            surfaces = [self.overlay_font.render(line, True, (255, 255, 255)) for line in lines]
+
+            line_height = self.overlay_font.get_linesize()
+            width = max(surface.get_width() for surface in surfaces) + 20
+            self.overlay = pygame.Surface((width, line_height * len(lines) + 20), pygame.SRCALPHA)
+            self.overlay.fill((0, 0, 0, 170))
+            for i, surface in enumerate(surfaces):
+                self.overlay.blit(surface, (10, 10 + i * line_height))
+            self.overlay_time = now
+
+        return self.screen.blit(self.overlay, (10, 10))
+
+    def escape_key(self, event):
+        if event.key == K_ESCAPE:
+            self.quit()
+
+    def title_key(self, event):
+        if event.key == K_RETURN:
+            if self.play_input(START) and self.party.verbose:
+                print(self.party.deck)
+        elif event.key == K_ESCAPE:
+            self.quit()
+
+    def basement_click(self, event):
+        if self.party_screen.end_d_button.is_clicked(event):
+            self.play_input(END_DAY)
+        elif self.party_screen.door_button.is_clicked(event):
+            self.play_input(DOOR)
+
+    def continue_key(self, event):
+        # Raged or Overflow Screen
+        if event.key == K_RETURN:
+            self.play_input(CONTINUE)
+
+    def shop_click(self, event):
+        if self.shop_screen.next_d_button.is_clicked(event):
+            self.play_input(NEXT_DAY)
             return
 
-        elif self.rage_level >= 3:
-            self.end_day(raged=True)
-            game_state.current_screen = game_state.rage_screen
-            game_state.current_screen.play_music()
-            return
+        for button in self.shop_screen.hover_grid.buttons_at(event.pos):
+            item = self.shop_screen.items_by_button.get(button)
+            if item is not None:
+                self.purchase_shop_item(item)
 
-        elif self.star_level == 4:
-            game_state.current_screen = game_state.win_screen
-            game_state.current_screen.play_music()
-            return
+    def dispatch(self, event):
+        if event.type in POSITION_EVENTS and not self.viewport.direct:
+            event.pos = self.viewport.to_canvas(event.pos)
+        for handler in self.handlers.get(event.type, ()):
+            handler(event)
+        self.current_screen.handle(event)
 
-    def shuffle_gamers(self):
-        random.shuffle(self.deck)
+    def run(self):
+        self.running = True
+        last_update = time.perf_counter()
+        lag = 0.0
+
+        while self.running:
+            # Frame phases are only timed while the profiler is on
+            profiling = profiler.enabled
+            if profiling:
+                profiler.begin_frame()
+                start = time.perf_counter()
+
+            events = self.frames.next_events(self.current_screen.animating or profiling)
+            if profiling:
+                now = time.perf_counter()
+                profiler.record("wait", start, now)
+                start = now
+
+            for event in events:
+                self.dispatch(event)
+            if self.resized_at is not None and time.perf_counter() - self.resized_at > self.resize_delay:
+                self.resized_at = None
+                self.fit_canvas()
+            if profiling:
+                now = time.perf_counter()
+                profiler.record("events", start, now)
+                start = now
+
+            # Catch the animations up with the clock in fixed steps, then draw
+            # in between the last two
+            now = time.perf_counter()
+            lag += min(now - last_update, self.max_frame_time)
+            last_update = now
+            step = self.update_step
+            while lag >= step:
+                self.update(step)
+                lag -= step
+            self.current_screen.alpha = lag / step
+
+            if profiling:
+                now = time.perf_counter()
+                profiler.record("update", start, now)
+                start = now
+                if self.overlay_rect is not None:
+                    # Redraw what's under the overlay so it can be drawn fresh on top
+                    self.current_screen.invalidate(self.overlay_rect)
+
+            if self.dirty_rendering:
+                # Redraw only what changed, nothing at all on a static frame
+                rects = self.current_screen.render()
+            else:
+                # Render the current screen
+                self.current_screen.draw()
+                rects = None
+
+            if profiling and profiler.enabled:
+                now = time.perf_counter()
+                profiler.record("draw", start, now)
+                self.overlay_rect = self.draw_profiler()
+                if rects is not None:
+                    rects.append(self.overlay_rect)
+                start = time.perf_counter()
+                profiler.record("overlay", now, start)
+
+            # Update the display
+            rects = self.viewport.present(rects)
+            if rects is None:
+                pygame.display.flip()
+            elif rects:
+                pygame.display.update(rects)
+
+            if profiling:
+                profiler.record("display", start, time.perf_counter())
+                profiler.end_frame()
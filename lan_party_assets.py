@@ -0,0 +1,162 @@
+"""Caches for the surfaces the screens draw."""
+import hashlib
+import os
+import struct
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+
+class TextCache:
+    """Rendered text surfaces keyed by (font, text, antialias, colour), least recently used evicted first."""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, colour):
+        key = (font, text, antialias, tuple(colour))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, colour)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def __len__(self):
+        return len(self.surfaces)
+
+    def __repr__(self):
+        return f"TextCache({len(self.surfaces)}/{self.max_size} surfaces, {self.hits} hits, {self.misses} misses)"
+
+
+class AssetManager:
+    """Loads every image once per (path, size, alpha) and hands out display-format surfaces.
+
+    preload() decodes and scales images on a background thread; image() picks
+    those up (or loads on the spot) and converts them for the display, which
+    has to happen on the main thread.  Scaled surfaces are written to
+    cache_dir, so the next start skips decoding and scaling.
+    """
+    CACHE_MAGIC = b"LPS1"
+    CACHE_HEADER = struct.Struct("<4sHH?")
+
+    def __init__(self, cache_dir=".asset_cache", disk_cache=True):
+        self.cache_dir = cache_dir
+        self.disk_cache = disk_cache
+        self.surfaces = {}
+        self.pending = {}
+        self.executor = None
+
+        # (key, seconds, where it came from) for every image loaded
+        self.timings = []
+
+    @staticmethod
+    def key(path, size=None, alpha=True):
+        return path, tuple(size) if size else None, alpha
+
+    def image(self, path, size=None, alpha=True):
+        """Get the surface for an image, scaled to size if given."""
+        key = self.key(path, size, alpha)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            return surface
+
+        start = time.perf_counter()
+        future = self.pending.pop(key, None)
+        raw, source = future.result() if future else self._load(key)
+        surface = raw.convert_alpha() if alpha else raw.convert()
+        self.surfaces[key] = surface
+
+        if source == "decoded" and self.disk_cache:
+            self._submit(self._write_cache, key, surface.get_size(), pygame.image.tobytes(surface, "BGRA"))
+
+        self.timings.append((key, time.perf_counter() - start, source))
+        return surface
+
+    def preload(self, keys):
+        """Start decoding (path, size, alpha) keys on the background thread."""
+        for key in keys:
+            key = self.key(*key)
+            if key not in self.surfaces and key not in self.pending:
+                self.pending[key] = self._submit(self._load, key)
+
+    def _submit(self, fn, *args):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="assets")
+        return self.executor.submit(fn, *args)
+
+    def _load(self, key):
+        path, size, alpha = key
+        surface = self._read_cache(key)
+        if surface is not None:
+            return surface, "disk"
+
+        surface = pygame.image.load(path)
+        if size:
+            surface = pygame.transform.scale(surface, size)
+        return surface, "decoded"
+
+    def _cache_path(self, key):
+        path, size, alpha = key
+        stat = os.stat(path)
+        digest = hashlib.sha1(repr((path, size, alpha, stat.st_mtime_ns, stat.st_size)).encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest + ".surf")
+
+    def _read_cache(self, key):
+        if not self.disk_cache:
+            return None
+        try:
+            with open(self._cache_path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        # A short or damaged entry (say the disk filled up) is a miss, it gets decoded and written again
+        if len(data) < self.CACHE_HEADER.size:
+            return None
+        magic, width, height, alpha = self.CACHE_HEADER.unpack_from(data)
+        if magic != self.CACHE_MAGIC or len(data) != self.CACHE_HEADER.size + width * height * 4:
+            return None
+        return pygame.image.frombytes(data[self.CACHE_HEADER.size:], (width, height), "BGRA")
+
+    def _write_cache(self, key, size, pixels):
+        # Write to a temp file first so a half written cache entry is never read
+        path = self._cache_path(key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(self.CACHE_HEADER.pack(self.CACHE_MAGIC, size[0], size[1], key[2]))
+            f.write(pixels)
+        os.replace(temp_path, path)
+
+    def wait(self):
+        """Block until background loads and cache writes are done."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def report(self):
+        lines = [f"{len(self.surfaces)} images, {sum(s for _, s, _ in self.timings) * 1000:.1f}ms on the main thread"]
+        for (path, size, alpha), seconds, source in self.timings:
+            size_text = f"{size[0]}x{size[1]}" if size else "native"
+            lines.append(f"  {path:<32}{size_text:>10}  {source:<8}{seconds * 1000:7.2f}ms")
+        return "\n".join(lines)
+
+
+# Shared by every screen
+text_cache = TextCache()
+assets = AssetManager()
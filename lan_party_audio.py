@@ -0,0 +1,123 @@
+"""One mixer for the whole game: screen tracks that cross-fade and cached sound effects."""
+import os
+import time
+
+import pygame
+
+
+class AudioManager:
+    """Initializes the mixer once, keeps decoded effects in memory and decodes
+    screen tracks as they're needed.
+
+    Screen tracks play as Sounds on two reserved channels, so switching screens
+    fades the old channel out while the new one fades in.  A decoded track is
+    tens of MB, so only the current one is kept here; the outgoing one lives
+    on in its channel until the fade finishes and is freed then.
+    """
+    MUSIC_CHANNELS = 2
+
+    def __init__(self, fade_ms=400):
+        self.fade_ms = fade_ms
+        self.sounds = {}
+        self.tracks = {}
+        self.missing = set()
+        self.channels = None
+        self.current_channel = 0
+        self.current_track = None
+        self.track_started = 0.0
+
+        # (from track, to track, seconds) for every track change
+        self.transitions = []
+
+    def init(self):
+        if self.channels is not None:
+            return True
+        try:
+            if pygame.mixer.get_init() is None:
+                pygame.mixer.init()
+        except pygame.error as error:
+            print(f"No audio: {error}")
+            return False
+
+        # Keep the music channels away from effects
+        pygame.mixer.set_reserved(self.MUSIC_CHANNELS)
+        self.channels = [pygame.mixer.Channel(i) for i in range(self.MUSIC_CHANNELS)]
+        return True
+
+    def load(self, path):
+        """Decode a file into a Sound, or None if it can't be played."""
+        if path in self.missing or not self.init():
+            return None
+        if not os.path.exists(path):
+            print(f"Missing sound {path}")
+            self.missing.add(path)
+            return None
+        return pygame.mixer.Sound(path)
+
+    def sound(self, path):
+        """The decoded Sound for an effect, kept for every later play."""
+        sound = self.sounds.get(path)
+        if sound is None:
+            sound = self.load(path)
+            if sound is not None:
+                self.sounds[path] = sound
+        return sound
+
+    def preload(self, paths):
+        """Decode sounds ahead of time so the first play doesn't hitch."""
+        for path in paths:
+            self.sound(path)
+
+    def play_effect(self, path, volume=1.0):
+        sound = self.sound(path)
+        if sound is not None:
+            sound.set_volume(volume)
+            sound.play()
+
+    def play_track(self, path, volume=1.0, fade_ms=None):
+        """Loop a screen track, cross-fading from whatever is playing."""
+        if path == self.current_track:
+            return
+        start = time.perf_counter()
+        fade_ms = self.fade_ms if fade_ms is None else fade_ms
+
+        sound = self.load(path)
+        # Dropping the outgoing track here is safe: the channel fading it out holds
+        # its own reference, and lets go of it when the fade is done
+        self.tracks = {path: sound} if sound is not None else {}
+        if self.channels is not None:
+            outgoing = self.channels[self.current_channel]
+            if (start - self.track_started) * 1000 < fade_ms:
+                # SDL_mixer ignores a fade out before the fade in has turned the volume
+                # up, which would leave the track (and its Sound) looping for good
+                outgoing.stop()
+            else:
+                outgoing.fadeout(fade_ms)
+            self.current_channel = (self.current_channel + 1) % self.MUSIC_CHANNELS
+            if sound is not None:
+                sound.set_volume(volume)
+                self.channels[self.current_channel].play(sound, loops=-1, fade_ms=fade_ms)
+
+        self.transitions.append((self.current_track, path, time.perf_counter() - start))
+        self.current_track = path
+        self.track_started = start
+
+    def stop_music(self, fade_ms=0):
+        if self.channels is not None:
+            for channel in self.channels:
+                if fade_ms:
+                    channel.fadeout(fade_ms)
+                else:
+                    channel.stop()
+        self.tracks = {}
+        self.current_track = None
+
+    def report(self):
+        lines = [f"{len(self.sounds)} sounds and {len(self.tracks)} track resident"]
+        for old, new, seconds in self.transitions:
+            lines.append(f"  {old} -> {new}: {seconds * 1000:.2f}ms")
+        return "\n".join(lines)
+
+
+# Shared by every screen
+audio = AudioManager()
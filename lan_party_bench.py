@@ -0,0 +1,207 @@
+"""Benchmarks for startup, frame cost and rule throughput.
+
+Runs under SDL's dummy video and audio drivers, so it works on a machine
+without a display.  Results are saved as JSON (by default under .bench/,
+named after the current commit) and --compare prints how a run differs
+from an earlier one, so a regression shows up between commits.
+
+    python lan_party_bench.py
+    python lan_party_bench.py --compare .bench/abc1234.json
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pygame
+from pygame.locals import KEYDOWN, MOUSEMOTION, K_a
+
+from lan_party_engine import Party, CONTINUE, WIN
+
+
+def measure(fn, min_time=0.2, min_runs=5):
+    """Median and best seconds per call of fn, run until min_time has passed."""
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_runs or time.perf_counter() - start < min_time:
+        call_start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - call_start)
+    return statistics.median(times), min(times)
+
+
+def startup_child(cache_dir):
+    """Time GameState.__init__ in this process and print the result as JSON."""
+    from lan_party_assets import assets
+    from lan_party import GameState
+
+    assets.cache_dir = cache_dir
+    start = time.perf_counter()
+    game = GameState(verbose=False)
+    init = time.perf_counter() - start
+
+    # Everything the other screens will need, as if the player clicked through them all
+    for screen in game.screens.values():
+        screen.background
+    assets.wait()
+    print(json.dumps({"init": init, "ready": time.perf_counter() - start}))
+
+
+def bench_startup(results):
+    """Cold start has an empty asset cache, warm start reuses the one cold start wrote."""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for phase in ("cold", "warm"):
+            output = subprocess.run([sys.executable, __file__, "--startup-child", cache_dir],
+                                    capture_output=True, text=True, check=True).stdout
+            timings = json.loads(output.strip().splitlines()[-1])
+            results[f"startup.{phase}.init"] = timings["init"] * 1000, "ms"
+            results[f"startup.{phase}.ready"] = timings["ready"] * 1000, "ms"
+
+
+def seat_party(party, desks):
+    """Fill every desk with a gamer, cycling through the types."""
+    names = list(party.config.gamer_stats)
+    party.desks = desks
+    party.in_party = [party.config.new_gamer(names[i % len(names)]) for i in range(desks)]
+
+
+def bench_frames(results, game):
+    basement = game.party_screen
+    party = game.party
+    for desks in (5, 50, 500, 10_000):
+        seat_party(party, desks)
+        median, _ = measure(basement.draw)
+        results[f"frame.basement.{desks}_desks"] = median * 1000, "ms"
+    seat_party(party, 5)
+    party.in_party = []
+
+    median, _ = measure(game.shop_screen.draw)
+    results["frame.shop"] = median * 1000, "ms"
+
+
+def bench_dispatch(results, game):
+    """Cost per event of GameState.dispatch, the work run() does for each event it gets."""
+    game.switch_screen(game.party_screen)
+    count = 1000
+    motions = [pygame.event.Event(MOUSEMOTION, pos=(i * 7 % 1920, i * 13 % 1080), rel=(0, 0), buttons=(0, 0, 0))
+               for i in range(count)]
+    keys = [pygame.event.Event(KEYDOWN, key=K_a, mod=0, unicode="a", scancode=4)] * count
+
+    for name, events in (("mouse_motion", motions), ("key", keys)):
+        def dispatch_all():
+            for event in events:
+                game.dispatch(event)
+        median, _ = measure(dispatch_all)
+        results[f"dispatch.{name}"] = median / count * 1e6, "us"
+
+
+def bench_rules(results, seconds=0.5):
+    """let_in_party and end_day calls per second, playing cautiously so days last a few draws."""
+    party = Party(verbose=False, seed=0)
+    draws = days = 0
+    draw_time = end_time = 0.0
+
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        party.start_day()
+        outcome = CONTINUE
+        while outcome == CONTINUE and party.deck and len(party.in_party) < party.desks and party.rage_level < 2:
+            start = time.perf_counter()
+            outcome = party.let_in_party().outcome
+            draw_time += time.perf_counter() - start
+            draws += 1
+
+        if outcome == CONTINUE or outcome == WIN:
+            start = time.perf_counter()
+            party.end_day(win=outcome == WIN)
+            end_time += time.perf_counter() - start
+            days += 1
+        if party.turns_remaining <= 0:
+            party = Party(verbose=False, seed=days)
+
+    results["rules.let_in_party"] = draws / draw_time, "calls/sec"
+    results["rules.end_day"] = days / end_time, "calls/sec"
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmarks(startup=True):
+    from lan_party import GameState
+
+    results = {}
+    if startup:
+        bench_startup(results)
+
+    game = GameState(verbose=False)
+    bench_frames(results, game)
+    bench_dispatch(results, game)
+    bench_rules(results)
+    return results
+
+
+def compare(old, new, threshold=0.1):
+    """Lines describing each result's change, flagging ones that got worse by more than threshold."""
+    lines = []
+    for name, (value, unit) in new.items():
+        if name not in old:
+            continue
+        old_value = old[name][0]
+        change = (value - old_value) / old_value if old_value else 0.0
+        # Rates are better higher, times are better lower
+        worse = -change if unit.endswith("/sec") else change
+        flag = "  REGRESSION" if worse > threshold else ""
+        lines.append(f"{name:<32}{old_value:14.3f}{value:14.3f} {unit:<10}{change:+8.1%}{flag}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Lan Party under SDL's dummy drivers.")
+    parser.add_argument("--output", default=None, help="JSON file to write, defaults to .bench/<commit>.json")
+    parser.add_argument("--compare", default=None, help="Earlier JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Change that counts as a regression")
+    parser.add_argument("--no-startup", action="store_true", help="Skip the cold/warm startup runs")
+    parser.add_argument("--startup-child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.startup_child:
+        startup_child(args.startup_child)
+        return
+
+    results = run_benchmarks(startup=not args.no_startup)
+    for name, (value, unit) in results.items():
+        print(f"{name:<32}{value:14.3f} {unit}")
+
+    commit = current_commit()
+    output = args.output or os.path.join(".bench", f"{commit}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"commit": commit, "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                   "python": platform.python_version(), "pygame": pygame.version.ver,
+                   "results": results}, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print(f"\nCompared with {old['commit']} ({old['time']})")
+        print(compare(old["results"], results, args.threshold))
+
+
+if __name__ == '__main__':
+    main()
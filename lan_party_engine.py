@@ -0,0 +1,669 @@
+"""Game rules for Lan Party.
+
+Nothing in here imports pygame, so the rules can be played by the screens in
+lan_party.py as well as by headless tools like lan_party_sim.py.
+"""
+import hashlib
+import json
+import os
+import random
+
+# Outcomes of letting a gamer in or ending the day
+CONTINUE = 0
+BANKED = 1
+OVERFLOW = 2
+RAGED = 3
+WIN = 4
+OUTCOME_NAMES = ("continue", "banked", "overflow", "raged", "win")
+
+# Triggers a gamer's ability can react to.  A gamer's neighbour is whoever takes
+# the seat after theirs: seats are a line in the rules, the rows of desks are
+# only how the basement screen happens to wrap that line at its zoom level
+ON_ENTER = "on_enter"                      # This gamer was let in
+ON_NEIGHBOUR_ENTER = "on_neighbour_enter"  # The next gamer in sat down in the seat after this one
+ON_END_DAY = "on_end_day"                  # The day was banked with this gamer in the party
+ON_RAGE = "on_rage"                        # The party raged out with this gamer in it
+TRIGGERS = (ON_ENTER, ON_NEIGHBOUR_ENTER, ON_END_DAY, ON_RAGE)
+
+
+class Ability:
+    """Effects a gamer type runs on triggers, each called as effect(party, gamer, other).
+
+    other is the gamer that set the trigger off (the one who came in) or None
+    for the end of the day.  Effects change the party directly, usually
+    day_coin/day_rep so they pay out with the rest of the day.
+    """
+    __slots__ = ("name", "effects")
+
+    def __init__(self, name, **effects):
+        unknown = set(effects) - set(TRIGGERS)
+        if unknown:
+            raise ValueError(f"Unknown triggers for {name}: {sorted(unknown)}")
+        self.name = name
+        self.effects = effects
+
+    def __repr__(self):
+        return f"Ability({self.name}, {', '.join(self.effects)})"
+
+
+def _hype(party, gamer, other):
+    party.day_rep += 1
+
+
+def _tip(party, gamer, other):
+    party.coin += 1
+
+
+def _sulk(party, gamer, other):
+    party.rep = max(0, party.rep - 1)
+
+
+def _greet(party, gamer, other):
+    party.day_coin += 1
+
+
+# Abilities a type can name in the stat file with ability=<name>
+ABILITIES = {ability.name: ability for ability in (
+    Ability("Hype", on_neighbour_enter=_hype),  # +1 REP for the day when someone takes the seat after them
+    Ability("Tipper", on_end_day=_tip),         # +1 COIN when the day is banked
+    Ability("Sore Loser", on_rage=_sulk),       # -1 REP when the party rages out
+    Ability("Greeter", on_enter=_greet),        # +1 COIN for the day as they come in
+)}
+
+# One stock ability per stock type, for ability_config()
+STOCK_ABILITIES = {"Rich Gamer": "Greeter", "Normal Gamer": "Hype", "Calm Gamer": "Tipper",
+                   "Angry Gamer": "Sore Loser"}
+
+
+def ability_config():
+    """The default config with STOCK_ABILITIES given to the stock types."""
+    return GameConfig(gamer_abilities={**DEFAULT_CONFIG.gamer_abilities, **STOCK_ABILITIES})
+
+STAT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gamer_types.txt")
+STAT_FIELDS = ("rep", "coin", "rage", "star")
+
+
+def load_gamer_types(path=STAT_FILE):
+    """Read a stat sheet into {name: (rep, coin, rage, star)}, {name: sprite path}
+    and {name: ability name or None}.
+
+    Lines are written like the stat sheet in READ ME.txt,
+    "Rich Gamer"(green), rep=2, coin=1, rage=0, plus optional sprite=path and
+    ability=<one of ABILITIES>.  Stats left out are 0 and lines that don't
+    start with a quoted name are skipped.
+    """
+    stats = {}
+    sprites = {}
+    abilities = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith('"'):
+                continue
+            name, _, rest = line[1:].partition('"')
+            fields = {}
+            for part in rest.split(","):
+                key, sep, value = part.partition("=")
+                if sep:
+                    fields[key.strip(" ()").lower()] = value.strip(" ()")
+            stats[name] = tuple(int(fields.get(stat, 0)) for stat in STAT_FIELDS)
+            if "sprite" in fields:
+                sprites[name] = fields["sprite"]
+            abilities[name] = fields.get("ability")
+            if abilities[name] is not None and abilities[name] not in ABILITIES:
+                raise ValueError(f"{path}: unknown ability {abilities[name]!r} for {name}")
+    return stats, sprites, abilities
+
+
+# Defaults for GameConfig: name -> (rep, coin, rage, star), the sprite and the ability for each type
+GAMER_STATS, GAMER_SPRITES, GAMER_ABILITIES = load_gamer_types()
+
+STARTING_DECK = ["Normal Gamer"] * 3 + ["Angry Gamer"] * 3
+
+# Shop stock: name -> (cost, currency).  A desk is sold at its listed price but also needs
+# Party.desk_cost in hand, which goes up with each one bought
+SHOP_ITEMS = {
+    "New Desk": (5, "coin"),
+    "Rich Gamer": (10, "rep"),
+    "Angry Gamer": (8, "rep"),
+    "Normal Gamer": (5, "rep"),
+    "Star Gamer": (25, "rep"),
+    "Calm Gamer": (15, "rep"),
+}
+
+MASK64 = (1 << 64) - 1
+
+
+def mix64(x):
+    """splitmix64 finalizer, the same arithmetic lan_party_vector does on uint64 arrays."""
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x ^= x >> 30
+    x = (x * 0xBF58476D1CE4E5B9) & MASK64
+    x ^= x >> 27
+    x = (x * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+class KeyedShuffle:
+    """Counter-based shuffler for Party.rng.
+
+    The n-th shuffle of a stream sorts the deck by hashed keys of
+    (seed, stream, n, position), so a party seeded with KeyedShuffle(seed, i)
+    deals exactly like party i of a VectorParty with the same seed.
+    """
+
+    def __init__(self, seed=0, stream=0):
+        self.seed = seed & MASK64
+        self.stream = stream
+        self.shuffles = 0
+
+    def base_key(self):
+        return mix64(mix64(mix64(self.seed) ^ self.stream) ^ self.shuffles)
+
+    def shuffle(self, seq):
+        base = self.base_key()
+        keys = [mix64((base + i) & MASK64) for i in range(len(seq))]
+        order = sorted(range(len(seq)), key=keys.__getitem__)
+        seq[:] = [seq[i] for i in order]
+        self.shuffles += 1
+
+
+class Gamer:
+    """One type of gamer.  Gamers are interned, one shared Gamer per name and
+    stats, and type_id is per name, so it can index per-type tables (a deck's
+    counts, sprites) instead of comparing names."""
+    __slots__ = ("name", "rep", "coin", "rage", "ability", "cost", "star", "sprite", "type_id")
+
+    def __init__(self, name, rep=0, coin=0, rage=0, ability=None, cost=1, star=False, sprite=None):
+        self.name = name
+        self.rep = rep
+        self.coin = coin
+        self.rage = rage
+        self.ability = ability
+        self.cost = cost
+        self.star = star
+        self.sprite = sprite
+
+        # Set once the gamer's type is interned
+        self.type_id = None
+
+    def __str__(self):
+        return (f"I am a {self.name},"
+                f" I give {self.rep}REP and {self.coin}COIN"
+                f"I give {self.rage} RAGE"
+                f"I have this ability:{self.ability}"
+                f"I cost {self.cost}")
+
+    def __repr__(self):
+        return f"Gamer({self.name}, {self.rep}, {self.coin}, {self.rage}, {self.ability}, {self.cost})"
+
+    def use_ability(self, trigger, party, other=None):
+        """Run this gamer's effect for a trigger, if it has one."""
+        effect = self.ability.effects.get(trigger) if self.ability is not None else None
+        if effect is not None:
+            if party.verbose:
+                print(f"{self.name} used {self.ability.name}!")
+            effect(party, self, other)
+
+
+# Type ids are per gamer name, so configs that only change stats (every cell
+# of a sweep) share them and the registry stays the size of the stat sheet.
+# Deck orders store type ids as bytes, so there can't be more than MAX_TYPES names
+MAX_TYPES = 256
+type_names = []
+_name_ids = {}
+# Sprite path per type id, from the first gamer of the type that came with one
+type_sprites = []
+
+# One shared Gamer per distinct profile
+_profiles = {}
+
+
+def intern_gamer(gamer):
+    """The shared gamer with the same name and stats as this one, registering it if it's new."""
+    if gamer.type_id is not None:
+        return gamer
+
+    key = (gamer.name, gamer.rep, gamer.coin, gamer.rage, gamer.star, gamer.ability, gamer.cost)
+    shared = _profiles.get(key)
+    if shared is None:
+        type_id = _name_ids.get(gamer.name)
+        if type_id is None:
+            if len(type_names) == MAX_TYPES:
+                raise ValueError(f"Can't intern {gamer.name}: there are already {MAX_TYPES} gamer types")
+            type_id = _name_ids[gamer.name] = len(type_names)
+            type_names.append(gamer.name)
+            type_sprites.append(None)
+        if type_sprites[type_id] is None:
+            type_sprites[type_id] = gamer.sprite
+        gamer.type_id = type_id
+        shared = _profiles[key] = gamer
+    return shared
+
+
+def new_gamer(name):
+    """The shared gamer for a type on the stat sheet."""
+    return DEFAULT_CONFIG.new_gamer(name)
+
+
+class GameConfig:
+    """Every number the economy is balanced on, so tools can try other values.
+
+    Party reads its starting deck, desks, turns, desk prices and shop stock
+    from one of these.  Configs round-trip through JSON and key() hashes the
+    contents, which lan_party_sweep uses to cache results per configuration.
+    """
+
+    def __init__(self, gamer_stats=None, starting_deck=None, shop_items=None,
+                 desks=5, desk_cost=5, desk_cost_step=2, turns=25, gamer_abilities=None):
+        self.gamer_stats = {name: tuple(stats) for name, stats in (gamer_stats or GAMER_STATS).items()}
+        self.gamer_abilities = dict(gamer_abilities if gamer_abilities is not None else GAMER_ABILITIES)
+        self.starting_deck = list(starting_deck if starting_deck is not None else STARTING_DECK)
+        self.shop_items = {name: tuple(item) for name, item in (shop_items or SHOP_ITEMS).items()}
+        self.desks = desks
+        self.desk_cost = desk_cost
+        self.desk_cost_step = desk_cost_step
+        self.turns = turns
+
+        # Free items would let a shopping loop buy forever
+        free = [name for name, (cost, currency) in self.shop_items.items() if cost <= 0]
+        if free:
+            raise ValueError(f"Shop items must cost something: {', '.join(free)}")
+        if self.desk_cost <= 0 or self.desk_cost_step < 0:
+            raise ValueError(f"Desks must cost something and not get cheaper,"
+                             f" got desk_cost={self.desk_cost} desk_cost_step={self.desk_cost_step}")
+
+    @property
+    def ability_types(self):
+        """Names of the types that have an ability."""
+        return [name for name, ability in self.gamer_abilities.items() if ability]
+
+    def new_gamer(self, name):
+        """The shared gamer for a type with this config's stats."""
+        rep, coin, rage, star = self.gamer_stats[name]
+        ability = self.gamer_abilities.get(name)
+        return intern_gamer(Gamer(name, rep=rep, coin=coin, rage=rage, star=star,
+                                  ability=ABILITIES[ability] if ability else None,
+                                  sprite=GAMER_SPRITES.get(name)))
+
+    def to_dict(self):
+        return {
+            "gamer_stats": {name: list(stats) for name, stats in self.gamer_stats.items()},
+            "gamer_abilities": dict(self.gamer_abilities),
+            "starting_deck": list(self.starting_deck),
+            "shop_items": {name: list(item) for name, item in self.shop_items.items()},
+            "desks": self.desks,
+            "desk_cost": self.desk_cost,
+            "desk_cost_step": self.desk_cost_step,
+            "turns": self.turns,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def copy(self):
+        return GameConfig.from_dict(self.to_dict())
+
+    def key(self):
+        """Content hash, equal for configs with the same numbers."""
+        text = json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def __eq__(self, other):
+        return isinstance(other, GameConfig) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"GameConfig({self.key()[:12]})"
+
+
+DEFAULT_CONFIG = GameConfig()
+
+# The stat sheet gets the first type ids, in order
+for _name in GAMER_STATS:
+    new_gamer(_name)
+
+
+class Deck:
+    """The gamers waiting to be let in, as a counted multiset of shared gamers.
+
+    counts[type_id] says how many of each type are left and types[type_id] is
+    the gamer dealt for it, so a deck holds one set of stats per name.  The
+    draw order is a bytearray of type ids read from a cursor, so a draw is
+    O(1) and a deck of 100k gamers is 100k bytes.  A lazy deck keeps no order
+    at all: shuffling is free and each draw picks a type weighted by the
+    counts, in O(types).
+    """
+
+    def __init__(self, gamers=(), lazy=False):
+        self.lazy = lazy
+        self.counts = [0] * len(type_names)
+        self.types = [None] * len(type_names)
+        self.size = 0
+        self.order = bytearray()
+        self.pos = 0
+        self.extend(gamers)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        if self.lazy:
+            for type_id, count in enumerate(self.counts):
+                for _ in range(count):
+                    yield self.types[type_id]
+        else:
+            for type_id in self.order[self.pos:]:
+                yield self.types[type_id]
+
+    def __repr__(self):
+        return f"Deck({self.type_counts()})"
+
+    def type_counts(self):
+        return {type_names[type_id]: count for type_id, count in enumerate(self.counts) if count}
+
+    def grow(self):
+        """Make room in counts and types for names interned since the deck was made."""
+        missing = len(type_names) - len(self.counts)
+        if missing > 0:
+            self.counts.extend([0] * missing)
+            self.types.extend([None] * missing)
+
+    def deal_as(self, gamer):
+        """Type id of an interned gamer, which this deck deals from then on for its type."""
+        type_id = gamer.type_id
+        dealt = self.types[type_id]
+        if dealt is not gamer:
+            if dealt is not None:
+                raise ValueError(f"Can't put {gamer!r} in a deck that has {dealt!r}: one set of stats per type")
+            self.types[type_id] = gamer
+        return type_id
+
+    def add_type(self, gamer, count=1):
+        """Add count gamers of one type (or take them away, for a lazy deck)."""
+        gamer = intern_gamer(gamer)
+        self.grow()
+        type_id = self.deal_as(gamer)
+        self.counts[type_id] += count
+        self.size += count
+        if not self.lazy:
+            if self.pos * 2 > len(self.order):
+                self.compact()
+            self.order.extend(bytes([type_id]) * count)
+
+    def append(self, gamer):
+        self.add_type(gamer)
+
+    def extend(self, gamers):
+        types = self.types
+        type_ids = []
+        for gamer in gamers:
+            type_id = gamer.type_id
+            # Only gamers the deck hasn't dealt before need interning and checking
+            if type_id is None or type_id >= len(types) or types[type_id] is not gamer:
+                gamer = intern_gamer(gamer)
+                self.grow()
+                type_id = self.deal_as(gamer)
+            type_ids.append(type_id)
+        for type_id in type_ids:
+            self.counts[type_id] += 1
+        self.size += len(type_ids)
+        if not self.lazy:
+            # Drop drawn ids once they're the bigger half so the order doesn't grow without a shuffle
+            if self.pos * 2 > len(self.order):
+                self.compact()
+            self.order.extend(type_ids)
+
+    def draw(self, rng=random):
+        """Take the next gamer off the deck."""
+        if not self.size:
+            raise IndexError("draw from an empty deck")
+
+        if self.lazy:
+            type_id = self.sample(rng)
+        else:
+            type_id = self.order[self.pos]
+            self.pos += 1
+
+        self.counts[type_id] -= 1
+        self.size -= 1
+        return self.types[type_id]
+
+    def sample(self, rng=random):
+        """Pick a type id with probability proportional to how many are left."""
+        pick = int(rng.random() * self.size)
+        for type_id, count in enumerate(self.counts):
+            pick -= count
+            if pick < 0:
+                return type_id
+        raise IndexError("sample from an empty deck")
+
+    @classmethod
+    def from_order(cls, order, counts, gamers):
+        """A deck dealing these type ids (bytes) in order, given how many there are
+        of each and the gamers the ids stand for."""
+        gamers = [intern_gamer(gamer) for gamer in gamers]
+        deck = cls()
+        for gamer in gamers:
+            deck.deal_as(gamer)
+        deck.order = bytearray(order)
+        deck.counts = list(counts) + [0] * (len(type_names) - len(counts))
+        deck.size = len(deck.order)
+        return deck
+
+    def compact(self):
+        del self.order[:self.pos]
+        self.pos = 0
+
+    def shuffle(self, rng=random):
+        if not self.lazy:
+            self.compact()
+            rng.shuffle(self.order)
+
+
+class DrawResult:
+    """What happened when a gamer was let into the party."""
+    __slots__ = ("gamer", "outcome")
+
+    def __init__(self, gamer, outcome):
+        self.gamer = gamer
+        self.outcome = outcome
+
+    @property
+    def day_over(self):
+        return self.outcome != CONTINUE
+
+    def __repr__(self):
+        return f"DrawResult({self.gamer.name}, {OUTCOME_NAMES[self.outcome]})"
+
+
+class Party:
+    def __init__(self, deck=None, desks=None, rng=None, verbose=True, config=None, seed=None):
+        self.config = config if config is not None else DEFAULT_CONFIG
+        if deck is None:
+            deck = [self.config.new_gamer(name) for name in self.config.starting_deck]
+        self.deck = deck if isinstance(deck, Deck) else Deck(deck)
+        self.in_party = []
+        self.desks = desks if desks is not None else self.config.desks
+        self.coin = 0
+        self.rage_level = 0
+        self.star_level = 0
+        self.rep = 0
+        self.turns_remaining = self.config.turns
+        self.desk_cost = self.config.desk_cost
+
+        # What the gamers in the party pay out if the day ends now
+        self.day_coin = 0
+        self.day_rep = 0
+
+        # Gamers in the party whose ability reacts to the end of the day, by
+        # trigger, so ending a day with hundreds in only visits these
+        self.listeners = {ON_END_DAY: [], ON_RAGE: []}
+
+        # Anything with shuffle() (and random() for lazy decks), by default the
+        # party's own Random so a seeded party deals the same every time
+        self.seed = seed
+        self.rng = rng if rng is not None else random.Random(seed)
+
+        # Print a running commentary like the game does, simulations turn this off
+        self.verbose = verbose
+
+    def upgrade_desk(self):
+        if self.coin >= self.desk_cost:
+            self.desks += 1
+            self.desk_cost += self.config.desk_cost_step
+            if self.verbose:
+                print(f"Desk upgraded! Total desks: {self.desks}, Remaining coins: {self.coin}")
+            return True
+        else:
+            if self.verbose:
+                print("Not enough coins to upgrade desk!")
+            return False
+
+    def price(self, name):
+        """(cost, currency) of a shop item."""
+        return self.config.shop_items[name]
+
+    def buy(self, name):
+        """Buy a shop item if the party can afford it, returns True on success."""
+        cost, currency = self.price(name)
+        if getattr(self, currency) < cost:
+            if self.verbose:
+                print(f"Not enough {currency} to purchase {name}!")
+            return False
+
+        if name == "New Desk":
+            # upgrade_desk checks desk_cost but doesn't charge, the shop takes the listed price
+            if not self.upgrade_desk():
+                return False
+        else:
+            self.deck.append(self.config.new_gamer(name))
+        setattr(self, currency, getattr(self, currency) - cost)
+        return True
+
+    def start_day(self):
+        # Shuffles cards and signals a new day has started
+        self.shuffle_gamers()
+
+    def end_day(self, raged=False, over_flow=False, win=False):
+        if raged:
+            if self.verbose:
+                print(f"Raged to hard mom ended the party")
+            if self.listeners[ON_RAGE]:
+                self.trigger(ON_RAGE)
+
+        elif over_flow:
+            if self.verbose:
+                print("You overflowed! Mom ended the party!")
+
+        elif win:
+            if self.verbose:
+                print("You win!")
+
+        else:
+            if self.listeners[ON_END_DAY]:
+                self.trigger(ON_END_DAY)
+            self.coin += self.day_coin
+            self.rep += self.day_rep
+
+        # Refills deck
+        self.deck.extend(self.in_party)
+
+        # Clears the in party list for next day
+        self.in_party = []
+        self.listeners[ON_END_DAY].clear()
+        self.listeners[ON_RAGE].clear()
+
+        # Sets turn count
+        self.turns_remaining -= 1
+
+        # Resets rage level
+        self.rage_level = 0
+
+        self.star_level = 0
+
+        self.day_coin = 0
+        self.day_rep = 0
+
+        if self.verbose:
+            print(f"\nEND OF DAY REPORT\n----------------\n\n"
+                  f"COIN: {self.coin}\nREP: {self.rep}\nTurns remaining:{self.turns_remaining}\n rage:{self.rage_level}")
+
+    def let_in_party(self):
+        """Let the next gamer in and report how the day went on.
+
+        Overflow and rage end the day here; a win is left to the caller.
+        """
+        # Draw the next gamer
+        next_gamer = self.deck.draw(self.rng)
+
+        # Add to the party
+        self.in_party.append(next_gamer)
+        if self.verbose:
+            print(f"You've let {next_gamer.name} into the party!")
+            print(f"Current party members: {len(self.in_party)}")
+
+        # adds gamers rage to rage_level
+        self.rage_level += next_gamer.rage
+        self.star_level += next_gamer.star
+        self.day_coin += next_gamer.coin
+        self.day_rep += next_gamer.rep
+
+        # Abilities go before the checks below so they can change how the day goes
+        if next_gamer.ability is not None:
+            self.listen(next_gamer)
+            next_gamer.use_ability(ON_ENTER, self, next_gamer)
+        # Seats fill in order, so the newcomer's neighbour is the gamer in the seat before, even across a row end
+        if len(self.in_party) > 1 and self.in_party[-2].ability is not None:
+            self.in_party[-2].use_ability(ON_NEIGHBOUR_ENTER, self, next_gamer)
+
+        if self.verbose:
+            print(self.rage_level)
+        # Check for the party-ending rage condition
+        if len(self.in_party) > self.desks:
+            self.end_day(over_flow=True)
+            return DrawResult(next_gamer, OVERFLOW)
+
+        elif self.rage_level >= 3:
+            self.end_day(raged=True)
+            return DrawResult(next_gamer, RAGED)
+
+        elif self.star_level == 4:
+            return DrawResult(next_gamer, WIN)
+
+        return DrawResult(next_gamer, CONTINUE)
+
+    def listen(self, gamer):
+        """Add a seated gamer to the listeners for the triggers its ability reacts to."""
+        for trigger in gamer.ability.effects:
+            if trigger in self.listeners:
+                self.listeners[trigger].append(gamer)
+
+    def trigger(self, trigger, other=None):
+        """Run the abilities of every gamer in the party listening for a trigger."""
+        for gamer in self.listeners[trigger]:
+            gamer.use_ability(trigger, self, other)
+
+    def shuffle_gamers(self):
+        self.deck.shuffle(self.rng)
+
+
+def let_in(party, names):
+    """Put gamers on top of the deck in this order and let them in, returns the last outcome.
+
+    For checks that need a day dealt by hand.
+    """
+    gamers = [party.config.new_gamer(name) for name in names]
+    party.deck = Deck(gamers + list(party.deck))
+    for _ in gamers:
+        outcome = party.let_in_party().outcome
+    return outcome
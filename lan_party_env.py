@@ -0,0 +1,404 @@
+"""Lan Party as a reset/step environment for training bots.
+
+The API follows Gymnasium (reset() -> (obs, info), step(action) ->
+(obs, reward, terminated, truncated, info)) without depending on it.  If
+gymnasium is installed, the envs also get action_space and
+observation_space.
+
+Actions:
+    0        open the door (starting the day if no one is in yet)
+    1        end the day and bank what the party pays
+    2 + i    buy shop item i, only before the day's first gamer is let in
+
+The observation is an int32 vector: gamers of each type still in the deck,
+gamers of each type in the party, then rage level, star level, COIN, REP,
+desks and turns remaining.  The reward is the COIN + REP banked on a step,
+plus win_reward for the fourth star.  An episode is one game and ends on a
+win or when the turns run out.
+
+LanPartyEnv plays one game on a Party.  VectorLanPartyEnv plays n games on a
+VectorParty, one NumPy call per step for the whole batch, and
+SubprocVectorEnv splits the rows of one of those across worker processes
+that share their buffers with the caller.  Seeded the same, all three deal
+identically: row i of a vector env is LanPartyEnv(rng=KeyedShuffle(seed, i)).
+All of them take a GameConfig; the vector ones refuse configs with abilities,
+which VectorParty can't play.
+
+    python lan_party_env.py --envs 4096 --steps 200 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from lan_party_engine import Party, KeyedShuffle, GameConfig, DEFAULT_CONFIG, CONTINUE, BANKED, WIN
+from lan_party_vector import VectorParty
+
+try:
+    from gymnasium import spaces
+except ImportError:
+    spaces = None
+
+OPEN_DOOR = 0
+END_DAY = 1
+BUY = 2
+
+
+def _spaces(env):
+    if spaces is not None:
+        env.action_space = spaces.Discrete(env.n_actions)
+        info = np.iinfo(np.int32)
+        env.observation_space = spaces.Box(info.min, info.max, (env.observation_size,), np.int32)
+
+
+class LanPartyEnv:
+    """One game of Lan Party on a Party object."""
+
+    def __init__(self, config=None, rng=None, coin_weight=1, rep_weight=1, win_reward=100):
+        self.config = config if config is not None else DEFAULT_CONFIG
+        self.rng = rng
+        self.coin_weight = coin_weight
+        self.rep_weight = rep_weight
+        self.win_reward = win_reward
+
+        self.shop_items = list(self.config.shop_items)
+        self.type_ids = [self.config.new_gamer(name).type_id for name in self.config.gamer_stats]
+        self.n_actions = BUY + len(self.shop_items)
+        self.observation_size = 2 * len(self.type_ids) + 6
+        _spaces(self)
+
+        self.party = None
+        self.in_day = False
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = random.Random(seed)
+        self.party = Party(rng=self.rng, verbose=False, config=self.config)
+        self.in_day = False
+        return self.observation(), {}
+
+    def observation(self):
+        party = self.party
+        counts = party.deck.counts
+        in_party = [0] * len(self.type_ids)
+        for gamer in party.in_party:
+            in_party[self.type_ids.index(gamer.type_id)] += 1
+        return np.array([counts[type_id] if type_id < len(counts) else 0 for type_id in self.type_ids]
+                        + in_party
+                        + [party.rage_level, party.star_level, party.coin, party.rep,
+                           party.desks, party.turns_remaining], dtype=np.int32)
+
+    def bank(self):
+        party = self.party
+        reward = self.coin_weight * party.day_coin + self.rep_weight * party.day_rep
+        party.end_day()
+        self.in_day = False
+        return reward
+
+    def step(self, action):
+        party = self.party
+        reward = 0
+        outcome = CONTINUE
+
+        if action == OPEN_DOOR:
+            if not party.deck:
+                # Nobody left to let in, all the player can do is end the day
+                reward = self.bank()
+                outcome = BANKED
+            else:
+                if not self.in_day:
+                    party.start_day()
+                    self.in_day = True
+                outcome = party.let_in_party().outcome
+                if outcome == WIN:
+                    party.end_day(win=True)
+                    reward = self.win_reward
+                if outcome != CONTINUE:
+                    self.in_day = False
+
+        elif action == END_DAY:
+            reward = self.bank()
+            outcome = BANKED
+
+        elif not self.in_day:
+            party.buy(self.shop_items[action - BUY])
+
+        terminated = outcome == WIN or party.turns_remaining <= 0
+        return self.observation(), reward, terminated, False, {"outcome": outcome}
+
+
+class VectorLanPartyEnv:
+    """n games stepped together on a VectorParty, with finished games reset in place.
+
+    step() returns the same preallocated arrays every call (pass buffers to
+    put them somewhere else, like shared memory), so copy anything you need
+    to keep.  Rows that finish on a step come back already reset; their last
+    observation is in info["final_observation"] where info["done"] is set.
+    """
+
+    def __init__(self, n, seed=0, first_stream=0, coin_weight=1, rep_weight=1, win_reward=100,
+                 buffers=None, config=None):
+        self.config = config if config is not None else DEFAULT_CONFIG
+        VectorParty.check_config(self.config)
+        self.n = n
+        self.seed = seed
+        self.first_stream = first_stream
+        self.coin_weight = coin_weight
+        self.rep_weight = rep_weight
+        self.win_reward = win_reward
+
+        self.shop_items = list(self.config.shop_items)
+        self.types = len(self.config.gamer_stats)
+        self.n_actions = BUY + len(self.shop_items)
+        self.observation_size = 2 * self.types + 6
+        _spaces(self)
+
+        if buffers is None:
+            buffers = allocate_buffers(n, self.observation_size)
+        (self.obs, self.final_obs, self.rewards, self.terminated, self.truncated) = buffers
+        self.info = {"final_observation": self.final_obs, "done": self.terminated}
+        self.vp = None
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed = seed
+        self.vp = VectorParty(self.n, seed=self.seed, first_stream=self.first_stream, config=self.config)
+        self.terminated[:] = False
+        self.observe(self.obs)
+        return self.obs, {}
+
+    def observe(self, out):
+        vp = self.vp
+        types = self.types
+        out[:, :types], out[:, types:2 * types] = vp.type_counts()
+        for column, array in enumerate((vp.rage_level, vp.star_level, vp.coin, vp.rep,
+                                        vp.desks, vp.turns_remaining), 2 * types):
+            out[:, column] = array
+
+    def step(self, actions):
+        vp = self.vp
+        actions = np.asarray(actions)
+
+        # Opening the door on an empty deck ends the day, like in LanPartyEnv
+        bank = vp.in_day & ((actions == END_DAY) | ((actions == OPEN_DOOR) & (vp.pos >= vp.deck_len)))
+        skip = ~vp.in_day & ((actions == END_DAY) | ((actions == OPEN_DOOR) & (vp.deck_len == 0)))
+        draw = (actions == OPEN_DOOR) & ~bank & ~skip
+
+        rewards = self.rewards
+        rewards[:] = 0
+        np.add(self.coin_weight * vp.day_coin, self.rep_weight * vp.day_rep, out=rewards, where=bank)
+        vp.end_day(bank)
+        # A day with nobody let in still uses a turn
+        vp.in_day[skip] = True
+        vp.end_day(skip)
+
+        for i in range(len(self.shop_items)):
+            buying = (actions == BUY + i) & ~vp.in_day
+            if buying.any():
+                vp.buy(self.shop_items[i], buying)
+
+        vp.start_day(draw & ~vp.in_day)
+        outcome = vp.let_in_party(draw)
+        won = outcome == WIN
+        rewards[won] += self.win_reward
+
+        np.logical_or(won, vp.turns_remaining <= 0, out=self.terminated)
+        if self.terminated.any():
+            self.observe(self.final_obs)
+            vp.reset(self.terminated)
+        self.observe(self.obs)
+        return self.obs, rewards, self.terminated, self.truncated, self.info
+
+    def close(self):
+        pass
+
+
+def allocate_buffers(n, observation_size, arrays=None):
+    """(obs, final obs, rewards, terminated, truncated) for n rows, optionally over given memory."""
+    shapes = [((n, observation_size), np.int32), ((n, observation_size), np.int32),
+              ((n,), np.float64), ((n,), bool), ((n,), bool)]
+    if arrays is None:
+        return tuple(np.zeros(shape, dtype) for shape, dtype in shapes)
+    return tuple(np.ndarray(shape, dtype, buffer=array.buf) for (shape, dtype), array in zip(shapes, arrays))
+
+
+def _buffer_sizes(n, observation_size):
+    return [n * observation_size * 4, n * observation_size * 4, n * 8, n, n]
+
+
+def _worker(conn, names, n, observation_size, start, stop, kwargs):
+    memory = [shared_memory.SharedMemory(name=name) for name in names + [names[-1] + "_actions"]]
+    buffers = allocate_buffers(n, observation_size, memory[:-1])
+    actions = np.ndarray((n,), np.int64, buffer=memory[-1].buf)[start:stop]
+    env = VectorLanPartyEnv(stop - start, first_stream=start,
+                            buffers=tuple(buffer[start:stop] for buffer in buffers), **kwargs)
+    try:
+        while True:
+            command, arg = conn.recv()
+            if command == "step":
+                env.step(actions)
+            elif command == "reset":
+                env.reset(arg)
+            elif command == "close":
+                break
+            conn.send(None)
+    finally:
+        del buffers, actions, env
+        for block in memory:
+            block.close()
+        conn.close()
+
+
+class SubprocVectorEnv:
+    """VectorLanPartyEnv with its rows split across worker processes.
+
+    Actions and results go through shared memory, the pipes only carry the
+    command, so a step costs two small messages per worker however many
+    rows there are.
+    """
+
+    def __init__(self, n, workers=None, seed=0, config=None, **kwargs):
+        self.config = config if config is not None else DEFAULT_CONFIG
+        # Refused here rather than in every worker
+        VectorParty.check_config(self.config)
+        kwargs["config"] = self.config
+        self.n = n
+        self.seed = seed
+        self.workers = max(1, min(workers or os.cpu_count(), n))
+        self.n_actions = BUY + len(self.config.shop_items)
+        self.observation_size = 2 * len(self.config.gamer_stats) + 6
+        _spaces(self)
+
+        self.memory = [shared_memory.SharedMemory(create=True, size=size)
+                       for size in _buffer_sizes(n, self.observation_size)]
+        self.memory.append(shared_memory.SharedMemory(create=True, size=n * 8,
+                                                      name=self.memory[-1].name + "_actions"))
+        (self.obs, self.final_obs, self.rewards,
+         self.terminated, self.truncated) = allocate_buffers(n, self.observation_size, self.memory[:-1])
+        self.actions = np.ndarray((n,), np.int64, buffer=self.memory[-1].buf)
+        self.info = {"final_observation": self.final_obs, "done": self.terminated}
+
+        names = [block.name for block in self.memory[:-1]]
+        bounds = np.linspace(0, n, self.workers + 1).astype(int)
+        self.conns = []
+        self.processes = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker, args=(child, names, n, self.observation_size, start, stop, kwargs), daemon=True)
+            process.start()
+            child.close()
+            self.conns.append(parent)
+            self.processes.append(process)
+
+    def _command(self, command, arg=None):
+        for conn in self.conns:
+            conn.send((command, arg))
+        for conn in self.conns:
+            conn.recv()
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed = seed
+        self._command("reset", self.seed)
+        return self.obs, {}
+
+    def step(self, actions):
+        self.actions[:] = actions
+        self._command("step")
+        return self.obs, self.rewards, self.terminated, self.truncated, self.info
+
+    def close(self):
+        if not self.conns:
+            return
+        for conn in self.conns:
+            conn.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.conns = []
+        del self.obs, self.final_obs, self.rewards, self.terminated, self.truncated, self.actions
+        for block in self.memory:
+            block.close()
+            block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def action_odds(n_actions, open_door, end_day):
+    """Probabilities for random play, with the rest split between the shop items."""
+    shop = (1 - open_door - end_day) / (n_actions - BUY)
+    return [open_door, end_day] + [shop] * (n_actions - BUY)
+
+
+def check_against_scalar(n=8, steps=2000, seed=0, config=None):
+    """Play random actions on a vector env and on scalar envs and compare every observation."""
+    vector = VectorLanPartyEnv(n, seed, config=config)
+    scalars = [LanPartyEnv(config=config, rng=KeyedShuffle(seed, i)) for i in range(n)]
+    obs, _ = vector.reset()
+    for i, env in enumerate(scalars):
+        if not np.array_equal(env.reset()[0], obs[i]):
+            raise AssertionError(f"Env {i} differs after reset")
+
+    rng = np.random.default_rng(seed)
+    for step in range(steps):
+        # Mostly open the door so games actually get somewhere
+        actions = rng.choice(vector.n_actions, size=n, p=action_odds(vector.n_actions, 0.6, 0.1))
+        obs, rewards, terminated, _, info = vector.step(actions)
+        for i, env in enumerate(scalars):
+            scalar_obs, reward, done, _, _ = env.step(actions[i])
+            vector_obs = info["final_observation"][i] if terminated[i] else obs[i]
+            if not np.array_equal(scalar_obs, vector_obs) or reward != rewards[i] or done != terminated[i]:
+                raise AssertionError(f"Env {i} differs at step {step}:\n{scalar_obs} {reward} {done}\n"
+                                     f"{vector_obs} {rewards[i]} {terminated[i]}")
+            if done:
+                env.reset()
+
+
+def benchmark(env, steps, seed=0):
+    rng = np.random.default_rng(seed)
+    actions = rng.choice(env.n_actions, size=(steps, env.n), p=action_odds(env.n_actions, 0.6, 0.2))
+    env.reset()
+    start = time.perf_counter()
+    for step_actions in actions:
+        env.step(step_actions)
+    return steps * env.n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure environment steps per second.")
+    parser.add_argument("--envs", type=int, default=4096)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None, help="Defaults to every core")
+    parser.add_argument("--config", default=None, help="GameConfig JSON file, defaults to the game's economy")
+    parser.add_argument("--check", action="store_true", help="Compare the vector env with scalar envs first")
+    args = parser.parse_args()
+
+    config = GameConfig.load(args.config) if args.config else DEFAULT_CONFIG
+    if args.check:
+        check_against_scalar(config=config)
+        print("Vector env matches the scalar env")
+
+    env = LanPartyEnv(config)
+    env.reset(0)
+    start = time.perf_counter()
+    for _ in range(args.steps * 10):
+        _, _, terminated, _, _ = env.step(random.randrange(env.n_actions))
+        if terminated:
+            env.reset()
+    print(f"scalar:     {args.steps * 10 / (time.perf_counter() - start):12,.0f} steps/sec")
+
+    print(f"sync:       {benchmark(VectorLanPartyEnv(args.envs, config=config), args.steps):12,.0f} steps/sec")
+    with SubprocVectorEnv(args.envs, args.workers, config=config) as env:
+        print(f"subprocess: {benchmark(env, args.steps):12,.0f} steps/sec ({env.workers} workers)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Resolution independence: logical coordinates, the canvas and the window.
+
+Screens are laid out in logical 1920x1080 coordinates (the size the art was
+painted at) and draw on a canvas of the same shape.  Layout turns logical
+positions and sizes into canvas pixels, so images get scaled once for the
+canvas and the same numbers work at any resolution.  Viewport puts the canvas
+in the window: letterboxed when the window isn't 16:9, and scaled up when the
+canvas is smaller than the window (render_scale below 1, for weak GPUs).
+"""
+import pygame
+
+LOGICAL_SIZE = (1920, 1080)
+
+
+class Layout:
+    """Logical coordinates to pixels on a canvas of canvas_size.
+
+    At 1920x1080 everything comes back unchanged.
+    """
+
+    def __init__(self, canvas_size):
+        self.canvas_size = tuple(canvas_size)
+        self.scale = self.canvas_size[0] / LOGICAL_SIZE[0]
+
+    def px(self, value):
+        """A logical length in pixels."""
+        return round(value * self.scale)
+
+    def pos(self, x, y):
+        return self.px(x), self.px(y)
+
+    def size(self, width, height):
+        return max(1, self.px(width)), max(1, self.px(height))
+
+    def images(self, keys):
+        """(path, size, alpha) keys with their logical sizes scaled, for assets.preload."""
+        return [(path, self.size(*size) if size else None, alpha) for path, size, alpha in keys]
+
+    def font(self, name, size):
+        return pygame.font.SysFont(name, max(1, self.px(size)))
+
+    def __repr__(self):
+        return f"Layout({self.canvas_size[0]}x{self.canvas_size[1]}, scale {self.scale:.3f})"
+
+
+def fit(window_size):
+    """The largest 16:9 size that fits in the window."""
+    scale = min(window_size[0] / LOGICAL_SIZE[0], window_size[1] / LOGICAL_SIZE[1])
+    return max(1, round(LOGICAL_SIZE[0] * scale)), max(1, round(LOGICAL_SIZE[1] * scale))
+
+
+def canvas_size(window_size, render_scale=1.0):
+    """What to draw at for a window: as big as fits, times render_scale."""
+    width, height = fit(window_size)
+    return max(1, round(width * render_scale)), max(1, round(height * render_scale))
+
+
+class Viewport:
+    """Where a canvas of canvas_size goes in the window.
+
+    When the canvas is exactly the size it gets shown at, it's a subsurface
+    of the window and drawing on it is drawing on the display.  Otherwise it's
+    a surface of its own and present() scales it into place.
+    """
+
+    def __init__(self, window, canvas_size):
+        self.window = window
+        window_rect = window.get_rect()
+        self.rect = pygame.Rect((0, 0), fit(window_rect.size))
+        self.rect.center = window_rect.center
+
+        self.scaled = tuple(canvas_size) != self.rect.size
+        if self.scaled:
+            self.canvas = pygame.Surface(canvas_size).convert()
+            self.target = window.subsurface(self.rect)
+        else:
+            self.canvas = window.subsurface(self.rect)
+        # Canvas coordinates are window coordinates, mouse positions don't need mapping
+        self.direct = not self.scaled and self.rect.topleft == (0, 0)
+
+        # Black bars where the window isn't 16:9, drawn by the first present()
+        self.bars = [rect for rect in (
+            pygame.Rect(0, 0, self.rect.left, window_rect.height),
+            pygame.Rect(self.rect.right, 0, window_rect.width - self.rect.right, window_rect.height),
+            pygame.Rect(0, 0, window_rect.width, self.rect.top),
+            pygame.Rect(0, self.rect.bottom, window_rect.width, window_rect.height - self.rect.bottom),
+        ) if rect.width and rect.height]
+        self.bars_drawn = False
+
+    def present(self, rects=None):
+        """Get what was drawn on the canvas into the window.
+
+        Takes the canvas rects that changed (None for all of it) and returns
+        the window rects to push to the display (None for all of it).
+        """
+        if not self.bars_drawn:
+            for rect in self.bars:
+                self.window.fill((0, 0, 0), rect)
+            self.bars_drawn = True
+            rects = None
+
+        if self.scaled:
+            # One scale of the whole canvas, cheaper than drawing at full size
+            if rects is None or rects:
+                pygame.transform.scale(self.canvas, self.rect.size, self.target)
+            return None if rects is None else [self.rect] if rects else []
+        if rects is None or self.direct:
+            return rects
+        return [rect.move(self.rect.topleft) for rect in rects]
+
+    def to_canvas(self, pos):
+        """A window position (the mouse) in canvas coordinates."""
+        x, y = pos
+        width, height = self.canvas.get_size()
+        return (x - self.rect.x) * width // self.rect.width, (y - self.rect.y) * height // self.rect.height
+
+    def __repr__(self):
+        width, height = self.canvas.get_size()
+        return f"Viewport({width}x{height} canvas in {self.rect}{', scaled' if self.scaled else ''})"
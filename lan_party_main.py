@@ -1,8 +1,51 @@
+import argparse
+import os
+
 from lan_party import GameState
+from lan_party_engine import ability_config
+from lan_party_net import ClientThread
+
+
+def window_size(text):
+    """Turn "1280x720" into (1280, 720)."""
+    width, _, height = text.lower().partition("x")
+    try:
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{text!r} isn't WIDTHxHEIGHT") from None
 
 
 def main():
-    game = GameState()
+    parser = argparse.ArgumentParser(description="Lan Party")
+    parser.add_argument("--seed", type=int, default=None, help="Deal the same game every time")
+    parser.add_argument("--record", default=".recordings/last_game.lpr",
+                        help="Where to record this game's inputs, see lan_party_replay.py")
+    parser.add_argument("--save", default=".saves/autosave.lps",
+                        help="Where the game saves at the end of each day and on quit (if anything was played)")
+    parser.add_argument("--resume", action="store_true", help="Carry on from the save instead of a new game")
+    parser.add_argument("--abilities", action="store_true",
+                        help="Give the stock gamer types their abilities (Greeter, Hype, Tipper, Sore Loser)")
+    parser.add_argument("--connect", default=None, metavar="HOST:PORT",
+                        help="Play on a lan_party_net server instead of on your own")
+    parser.add_argument("--room", default="basement", help="Room to join on the server")
+    parser.add_argument("--versus", action="store_true", help="A party of your own against the rest of the room")
+    parser.add_argument("--size", type=window_size, default=(1920, 1080), metavar="WIDTHxHEIGHT",
+                        help="Window size, the game is letterboxed to fit (F11 toggles fullscreen)")
+    parser.add_argument("--fullscreen", action="store_true")
+    parser.add_argument("--render-scale", type=float, default=1.0,
+                        help="Draw at this fraction of the window's resolution and scale up, for slow GPUs")
+    args = parser.parse_args()
+    if not 0 < args.render_scale <= 1:
+        parser.error("--render-scale must be more than 0 and at most 1")
+
+    display = {"size": args.size, "fullscreen": args.fullscreen, "render_scale": args.render_scale}
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        game = GameState(client=ClientThread(host, int(port), args.room, args.versus), **display)
+    else:
+        resume = args.save if args.resume and args.save and os.path.exists(args.save) else None
+        game = GameState(seed=args.seed, record=args.record or None, save=args.save or None, resume=resume,
+                         config=ability_config() if args.abilities else None, **display)
     game.run()
 
 
@@ -0,0 +1,545 @@
+"""LAN multiplayer: an asyncio server that owns the parties, and clients that send it inputs.
+
+The server plays every input through a lan_party_replay.Session, so the rules
+only run there and the deck's order never leaves it.  After each change a
+client gets a delta instead of the whole party: a bitmask of which numbers
+changed and their new values, the gamers seated since its last update (or
+the whole row again once a day ends) and the deck counts that moved.  Each
+client has one sender that always diffs against what that client last got,
+so a slow client gets fewer, bigger deltas rather than a growing backlog.
+
+In a shared room everyone plays one party.  In a versus room each player
+gets their own party, all dealt from the room's seed.
+
+    python lan_party_net.py serve --port 7777
+    python lan_party_main.py --connect localhost:7777 --room basement
+    python lan_party_net.py loadtest --clients 48 --room-size 4
+
+Wire format: every message is a little-endian u32 length and a payload whose
+first byte says what it is.  HELLO and WELCOME carry JSON, INPUT is an
+(action, arg) pair of lan_party_replay input codes, and DELTA is described
+at DeltaEncoder.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import statistics
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+from lan_party_engine import Party, Deck, GameConfig, DEFAULT_CONFIG
+from lan_party_replay import Session, SCREENS, START, DOOR, END_DAY, CONTINUE, NEXT_DAY, BUY
+
+# Message kinds
+HELLO = 1
+INPUT = 2
+WELCOME = 3
+DELTA = 4
+ERROR = 5
+
+FRAME_HEADER = struct.Struct("<I")
+INPUT_FORMAT = struct.Struct("<BBB")
+DELTA_HEADER = struct.Struct("<BIBH")
+# Far more than any real message, so a bad length can't make the server buffer gigabytes
+MAX_FRAME = 1 << 20
+
+SYNC_FIELDS = ("coin", "rep", "desks", "desk_cost", "turns_remaining", "rage_level", "star_level",
+               "day_coin", "day_rep")
+# Delta mask bits: the screen and SYNC_FIELDS take the low bits, then these
+SEATED_BIT = 1 << (1 + len(SYNC_FIELDS))
+DECK_BIT = SEATED_BIT << 1
+
+
+def frame(payload):
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader, limit=None):
+    (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if limit is not None and length > limit:
+        raise ValueError(f"{length} byte message")
+    return await reader.readexactly(length)
+
+
+def json_message(kind, data):
+    return frame(bytes((kind,)) + json.dumps(data).encode())
+
+
+class DeltaEncoder:
+    """Turns a session into DELTA messages for one client, remembering what it sent.
+
+    After the header (kind, ack, accepted, mask) comes an i32 for each set bit
+    of the screen and SYNC_FIELDS, then if SEATED_BIT is set a u32 of seats to
+    keep, a u32 count and that many gamer type indexes, then if DECK_BIT is set
+    a u16 count of (u8 type index, u32 count) pairs.  Type indexes are positions
+    in the config's gamer_stats, so both ends agree on them whatever order their
+    processes happened to intern gamer types in.
+    """
+
+    def __init__(self, config):
+        self.type_ids = [config.new_gamer(name).type_id for name in config.gamer_stats]
+        self.type_index = {type_id: i for i, type_id in enumerate(self.type_ids)}
+
+        # Nothing sent yet, so the first delta is the whole party
+        self.values = (None,) * (1 + len(SYNC_FIELDS))
+        self.in_party = None
+        self.seated = 0
+        self.counts = [0] * len(self.type_ids)
+
+    def deck_counts(self, deck):
+        counts = deck.counts
+        return [counts[type_id] if type_id < len(counts) else 0 for type_id in self.type_ids]
+
+    def encode(self, session, ack=0, accepted=True):
+        party = session.party
+        values = (SCREENS.index(session.screen),) + tuple(getattr(party, field) for field in SYNC_FIELDS)
+        mask = 0
+        changed = []
+        for bit, (old, new) in enumerate(zip(self.values, values)):
+            if old != new:
+                mask |= 1 << bit
+                changed.append(new)
+        self.values = values
+        body = struct.pack(f"<{len(changed)}i", *changed)
+
+        # in_party only gets appended to during a day and replaced when it ends
+        in_party = party.in_party
+        if in_party is not self.in_party or len(in_party) != self.seated:
+            keep = self.seated if in_party is self.in_party and len(in_party) > self.seated else 0
+            seated = bytes(self.type_index[gamer.type_id] for gamer in in_party[keep:])
+            body += struct.pack("<II", keep, len(seated)) + seated
+            mask |= SEATED_BIT
+            self.in_party = in_party
+            self.seated = len(in_party)
+
+        counts = self.deck_counts(party.deck)
+        moved = [(i, count) for i, (old, count) in enumerate(zip(self.counts, counts)) if old != count]
+        if moved:
+            body += struct.pack("<H", len(moved)) + b"".join(struct.pack("<BI", i, count) for i, count in moved)
+            mask |= DECK_BIT
+            self.counts = counts
+
+        return frame(DELTA_HEADER.pack(DELTA, ack, accepted, mask) + body)
+
+
+class PartyMirror:
+    """A client's copy of a party, only ever changed by deltas from the server.
+
+    The deck is lazy since only its counts are sent, which is all the odds
+    and the hint need.
+    """
+
+    def __init__(self, config):
+        self.party = Party(deck=Deck(lazy=True), config=config, verbose=False)
+        self.session = Session(self.party)
+        self.gamers = [config.new_gamer(name) for name in config.gamer_stats]
+
+    def apply(self, payload):
+        """Apply a DELTA payload, returns (ack, accepted)."""
+        kind, ack, accepted, mask = DELTA_HEADER.unpack_from(payload)
+        if kind != DELTA:
+            raise ValueError(f"Expected a delta, got message kind {kind}")
+        pos = DELTA_HEADER.size
+        party = self.party
+
+        for bit, field in enumerate(("screen",) + SYNC_FIELDS):
+            if mask & (1 << bit):
+                (value,) = struct.unpack_from("<i", payload, pos)
+                pos += 4
+                if field == "screen":
+                    self.session.screen = SCREENS[value]
+                else:
+                    setattr(party, field, value)
+
+        if mask & SEATED_BIT:
+            keep, count = struct.unpack_from("<II", payload, pos)
+            pos += 8
+            seated = [self.gamers[i] for i in payload[pos:pos + count]]
+            pos += count
+            if keep:
+                party.in_party.extend(seated)
+            else:
+                # A new list, like Party.end_day makes, so screens see the day changed
+                party.in_party = seated
+
+        if mask & DECK_BIT:
+            (count,) = struct.unpack_from("<H", payload, pos)
+            pos += 2
+            deck = party.deck
+            for _ in range(count):
+                i, new = struct.unpack_from("<BI", payload, pos)
+                pos += 5
+                type_id = self.gamers[i].type_id
+                old = deck.counts[type_id] if type_id < len(deck.counts) else 0
+                deck.add_type(self.gamers[i], new - old)
+
+        return ack, bool(accepted)
+
+
+class Player:
+    """A connected client: its session and the sender that keeps it up to date."""
+
+    def __init__(self, number, writer, room, session):
+        self.number = number
+        self.writer = writer
+        self.room = room
+        self.session = session
+        self.encoder = DeltaEncoder(session.party.config)
+        self.inputs = 0
+        self.accepted = True
+        self.changed = asyncio.Event()
+        self.changed.set()
+
+    async def send_updates(self):
+        while True:
+            await self.changed.wait()
+            self.changed.clear()
+            self.writer.write(self.encoder.encode(self.session, self.inputs, self.accepted))
+            await self.writer.drain()
+
+
+class Room:
+    def __init__(self, name, config, seed, versus):
+        self.name = name
+        self.config = config
+        self.seed = seed
+        self.versus = versus
+        self.players = set()
+        self.shared = None if versus else Session(Party(config=config, seed=seed, verbose=False))
+
+    def new_session(self):
+        if self.shared is not None:
+            return self.shared
+        return Session(Party(config=self.config, seed=self.seed, verbose=False))
+
+    def changed(self, session):
+        """Wake the sender of everyone looking at this session."""
+        for player in self.players:
+            if player.session is session:
+                player.changed.set()
+
+
+class PartyServer:
+    def __init__(self, config=DEFAULT_CONFIG, seed=None, verbose=True):
+        self.config = config
+        self.seed = seed
+        self.verbose = verbose
+        self.rooms = {}
+        self.players = 0
+        self.inputs = 0
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def join(self, hello):
+        name = str(hello.get("room", "basement"))
+        versus = bool(hello.get("versus", False))
+        room = self.rooms.get(name)
+        if room is None:
+            seed = self.seed if self.seed is not None else random.SystemRandom().randrange(1 << 32)
+            room = self.rooms[name] = Room(name, self.config, seed, versus)
+        elif room.versus != versus:
+            raise ValueError(f"Room {name} is {'versus' if room.versus else 'shared'}")
+        return room
+
+    async def handle(self, reader, writer):
+        player = sender = None
+        try:
+            payload = await read_frame(reader, MAX_FRAME)
+            if payload[:1] != bytes((HELLO,)):
+                raise ValueError("Expected a hello")
+            hello = json.loads(payload[1:])
+            if not isinstance(hello, dict):
+                raise ValueError("Expected a hello object")
+            room = self.join(hello)
+
+            self.players += 1
+            player = Player(self.players, writer, room, room.new_session())
+            room.players.add(player)
+            writer.write(json_message(WELCOME, {"player": player.number, "room": room.name, "seed": room.seed,
+                                                "versus": room.versus, "config": room.config.to_dict()}))
+            sender = asyncio.create_task(player.send_updates())
+            self.log(f"Player {player.number} joined {room.name} ({len(room.players)} there)")
+
+            while True:
+                payload = await read_frame(reader, MAX_FRAME)
+                if len(payload) != INPUT_FORMAT.size or payload[0] != INPUT:
+                    raise ValueError("Expected an input")
+                _, action, arg = INPUT_FORMAT.unpack(payload)
+                if action == BUY and arg >= len(player.session.shop_items):
+                    raise ValueError(f"No shop item {arg}")
+
+                player.accepted = player.session.play(action, arg)
+                player.inputs += 1
+                self.inputs += 1
+                # The sender acks even ignored inputs, so the client knows it was heard
+                player.changed.set()
+                if player.accepted:
+                    room.changed(player.session)
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as error:
+            self.log(f"Dropping a client: {error}")
+            writer.write(frame(bytes((ERROR,)) + str(error).encode()))
+        finally:
+            if sender is not None:
+                sender.cancel()
+            if player is not None:
+                room = player.room
+                room.players.discard(player)
+                if not room.players:
+                    del self.rooms[room.name]
+                self.log(f"Player {player.number} left {room.name}")
+            writer.close()
+
+    async def serve(self, host="0.0.0.0", port=7777):
+        server = await asyncio.start_server(self.handle, host, port)
+        address = server.sockets[0].getsockname()
+        # Flushed so a parent process (loadtest) can read the port
+        print(f"Listening on {address[0]}:{address[1]}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+class PartyClient:
+    """A connection to a PartyServer and the PartyMirror its deltas update."""
+
+    def __init__(self, reader, writer, welcome):
+        self.reader = reader
+        self.writer = writer
+        self.welcome = welcome
+        self.mirror = PartyMirror(GameConfig.from_dict(welcome["config"]))
+        self.sent = 0
+        self.ack = 0
+        self.bytes_received = 0
+
+    @classmethod
+    async def connect(cls, host, port, room="basement", versus=False):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(json_message(HELLO, {"room": room, "versus": versus}))
+        payload = await read_frame(reader)
+        if payload[0] == ERROR:
+            writer.close()
+            raise ConnectionError(payload[1:].decode())
+        return cls(reader, writer, json.loads(payload[1:]))
+
+    def send(self, action, arg=0):
+        self.writer.write(frame(INPUT_FORMAT.pack(INPUT, action, arg)))
+        self.sent += 1
+
+    async def read_delta(self):
+        payload = await read_frame(self.reader)
+        self.bytes_received += FRAME_HEADER.size + len(payload)
+        if payload[0] == ERROR:
+            raise ConnectionError(payload[1:].decode())
+        return payload
+
+    async def receive(self):
+        """Wait for the next delta and apply it, returns (ack, accepted)."""
+        ack, accepted = self.mirror.apply(await self.read_delta())
+        self.ack = ack
+        return ack, accepted
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+class ClientThread:
+    """Runs a PartyClient on its own event loop for GameState.
+
+    Deltas are only queued here; GameState.sync applies them on the pygame
+    thread so the screens never see a party halfway through an update.
+    on_update() is called from the network thread whenever one arrives.
+    """
+
+    def __init__(self, host, port, room="basement", versus=False, on_update=None, timeout=10):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.client = asyncio.run_coroutine_threadsafe(
+            PartyClient.connect(host, port, room, versus), self.loop).result(timeout)
+        self.mirror = self.client.mirror
+        self.on_update = on_update
+        self.deltas = collections.deque()
+        self.sent_actions = collections.deque()
+        self.error = None
+        asyncio.run_coroutine_threadsafe(self.receive_loop(), self.loop)
+
+    async def receive_loop(self):
+        try:
+            while True:
+                self.deltas.append(await self.client.read_delta())
+                if self.on_update is not None:
+                    self.on_update()
+        except (asyncio.IncompleteReadError, ConnectionError) as error:
+            self.error = error
+            if self.on_update is not None:
+                self.on_update()
+
+    def send(self, action, arg=0):
+        self.sent_actions.append(action)
+        self.loop.call_soon_threadsafe(self.client.send, action, arg)
+
+    def poll(self):
+        """Apply the deltas that have arrived, returns the actions acked by them and
+        whether the last of those was accepted."""
+        acked = []
+        accepted = False
+        while self.deltas:
+            ack, accepted = self.mirror.apply(self.deltas.popleft())
+            while self.client.ack < ack:
+                self.client.ack += 1
+                acked.append(self.sent_actions.popleft())
+        return acked, accepted
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+
+def bot_input(session, rng):
+    """A plausible (action, arg) for a headless client, None once the game is over."""
+    party = session.party
+    screen = session.screen
+    if screen == "win" or party.turns_remaining <= 0:
+        return None
+    if screen == "title":
+        return START, 0
+    if screen == "basement":
+        if party.deck and len(party.in_party) < min(3, party.desks):
+            return DOOR, 0
+        return END_DAY, 0
+    if screen in ("rage", "overflow"):
+        return CONTINUE, 0
+    if rng.random() < 0.5:
+        return BUY, rng.randrange(len(session.shop_items))
+    return NEXT_DAY, 0
+
+
+async def run_bot(host, port, room, versus, inputs, seed, latencies):
+    """One headless client sending an input at a time and timing each until its delta."""
+    rng = random.Random(seed)
+    client = await PartyClient.connect(host, port, room, versus)
+    # The welcome is followed by the first full delta
+    await client.receive()
+    try:
+        for _ in range(inputs):
+            move = bot_input(client.mirror.session, rng)
+            if move is None:
+                break
+            start = time.perf_counter()
+            client.send(*move)
+            while client.ack < client.sent:
+                await client.receive()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await client.close()
+    return client.bytes_received
+
+
+async def load_test(host, port, clients, room_size, versus, inputs, seed):
+    latencies = []
+    start = time.perf_counter()
+    received = await asyncio.gather(*(run_bot(host, port, f"load{i // room_size}", versus, inputs, seed + i,
+                                              latencies) for i in range(clients)))
+    return latencies, sum(received), time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def full_snapshot_size(config=DEFAULT_CONFIG, seed=0, days=10):
+    """Bytes of a delta sent from scratch, for a party a few days in."""
+    session = Session(Party(config=config, seed=seed, verbose=False))
+    rng = random.Random(seed)
+    for _ in range(days * 6):
+        move = bot_input(session, rng)
+        if move is None:
+            break
+        session.play(*move)
+    return len(DeltaEncoder(config).encode(session))
+
+
+def loadtest_main(args):
+    server = None
+    if args.server:
+        host, _, port = args.server.rpartition(":")
+        port = int(port)
+    else:
+        host = "127.0.0.1"
+        server = subprocess.Popen([sys.executable, __file__, "serve", "--host", host, "--port", "0", "--quiet"],
+                                  stdout=subprocess.PIPE, text=True)
+        port = int(server.stdout.readline().strip().rpartition(":")[2])
+
+    try:
+        latencies, received, seconds = asyncio.run(
+            load_test(host, port, args.clients, args.room_size, args.versus, args.inputs, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if not latencies:
+        print("No inputs were played")
+        raise SystemExit(1)
+    ms = [latency * 1000 for latency in latencies]
+    p99 = percentile(ms, 0.99)
+    print(f"{args.clients} clients in {'versus' if args.versus else 'shared'} rooms of {args.room_size}")
+    print(f"{len(ms)} inputs in {seconds:.2f}s ({len(ms) / seconds:,.0f} inputs/sec)")
+    print(f"Input to delta: median {statistics.median(ms):.2f}ms  p95 {percentile(ms, 0.95):.2f}ms"
+          f"  p99 {p99:.2f}ms  max {max(ms):.2f}ms")
+    print(f"{received / len(ms):.1f} bytes received per input,"
+          f" a full snapshot is {full_snapshot_size()} bytes")
+    if p99 > args.max_p99:
+        print(f"p99 is over {args.max_p99}ms")
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lan Party over the LAN.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Host parties")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=7777, help="0 picks a free port")
+    serve.add_argument("--config", default=None, help="GameConfig JSON file to play with")
+    serve.add_argument("--seed", type=int, default=None, help="Deal every room the same game")
+    serve.add_argument("--quiet", action="store_true", help="Don't log players coming and going")
+
+    loadtest = commands.add_parser("loadtest", help="Play headless clients against a server")
+    loadtest.add_argument("--server", default=None, metavar="HOST:PORT",
+                          help="Server to test, by default one is started on loopback")
+    loadtest.add_argument("--clients", type=int, default=48)
+    loadtest.add_argument("--room-size", type=int, default=4, help="Clients per room")
+    loadtest.add_argument("--versus", action="store_true", help="A party each instead of sharing one")
+    loadtest.add_argument("--inputs", type=int, default=200, help="Most inputs per client")
+    loadtest.add_argument("--seed", type=int, default=0)
+    loadtest.add_argument("--max-p99", type=float, default=50.0, help="Fail if p99 latency is over this (ms)")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        config = GameConfig.load(args.config) if args.config else DEFAULT_CONFIG
+        server = PartyServer(config, args.seed, verbose=not args.quiet)
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        loadtest_main(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""What the next door click can do, worked out from the deck's per-type counts."""
+class BustOdds:
+    """Exact odds for the next let_in_party, kept up to date from Deck.counts.
+
+    Each refresh walks the gamer types once, never the deck itself, and only
+    happens when the party or the deck's counts changed since the last one,
+    so asking every frame costs a look at the counts even for huge decks.
+
+    Only stats are counted.  Abilities run arbitrary code when gamers come in
+    or the day ends, so when the party's config gives any type one, exact is
+    False and these are the odds and payout before abilities.
+    """
+
+    def __init__(self, party):
+        self.party = party
+        self.exact = not party.config.ability_types
+        self.key = None
+        self.rage = 0.0
+        self.overflow = 0.0
+        self.win = 0.0
+        self.bank_coin = 0
+        self.bank_rep = 0
+
+    def update(self):
+        party = self.party
+        deck = party.deck
+        seated = len(party.in_party)
+        # The deck's make-up too, a shop purchase or a new deck can keep the size and change the odds
+        key = (deck, tuple(deck.counts), seated, party.rage_level, party.star_level, party.desks,
+               party.day_coin, party.day_rep)
+        if key == self.key:
+            return self
+        self.key = key
+
+        # Ending the day now pays exactly what the party holds
+        self.bank_coin = party.day_coin
+        self.bank_rep = party.day_rep
+
+        self.rage = self.overflow = self.win = 0.0
+        size = len(deck)
+        if not size:
+            return self
+
+        # Same order of checks as Party.let_in_party: overflow, then rage, then win
+        if seated + 1 > party.desks:
+            self.overflow = 1.0
+            return self
+
+        rage = win = 0
+        for type_id, count in enumerate(deck.counts):
+            if count:
+                gamer = deck.types[type_id]
+                if party.rage_level + gamer.rage >= 3:
+                    rage += count
+                elif party.star_level + gamer.star == 4:
+                    win += count
+        self.rage = rage / size
+        self.win = win / size
+        return self
+
+    def __repr__(self):
+        return (f"BustOdds(rage={self.rage:.1%}, overflow={self.overflow:.1%}, win={self.win:.1%},"
+                f" bank={self.bank_coin} COIN {self.bank_rep} REP)")
@@ -0,0 +1,151 @@
+"""Frame profiler: timed sections in a fixed-size ring buffer, exportable as a Chrome trace.
+
+GameState.run times the phases of each frame when the profiler is enabled,
+and enable() wraps the methods screens list in `profiled` so their calls
+show up as sub-timers.  Disabled, nothing is wrapped and run() only pays for
+an `if profiler.enabled` per phase.
+
+Traces load in chrome://tracing or https://ui.perfetto.dev.
+"""
+import json
+import time
+from array import array
+
+
+class Profiler:
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self.enabled = False
+
+        # Ring buffer of samples: name id, nesting depth, start and duration in seconds
+        self.name_ids = array("H", [0]) * capacity
+        self.depths = array("B", [0]) * capacity
+        self.starts = array("d", [0.0]) * capacity
+        self.durations = array("d", [0.0]) * capacity
+        self.count = 0
+
+        self.names = []
+        self._ids = {}
+        self.depth = 0
+        self.wrapped = []
+        self.frame_start = 0.0
+        self.origin = time.perf_counter()
+
+    def name_id(self, name):
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def record(self, name, start, end, depth=None):
+        i = self.count % self.capacity
+        self.name_ids[i] = self.name_id(name)
+        self.depths[i] = self.depth if depth is None else depth
+        self.starts[i] = start
+        self.durations[i] = end - start
+        self.count += 1
+
+    def begin_frame(self):
+        # Frame phases sit at depth 1, anything timed inside them deeper
+        self.depth = 1
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        self.record("frame", self.frame_start, time.perf_counter(), 0)
+        self.depth = 0
+
+    def timed(self, name, fn):
+        """fn wrapped to record a sample for every call."""
+        def timed_call(*args, **kwargs):
+            self.depth += 1
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(name, start, time.perf_counter())
+                self.depth -= 1
+        return timed_call
+
+    def enable(self, screens=()):
+        """Start sampling, timing each screen's `profiled` methods."""
+        if self.enabled:
+            return
+        self.enabled = True
+        for screen in screens:
+            prefix = type(screen).__name__
+            for method in screen.profiled:
+                setattr(screen, method, self.timed(f"{prefix}.{method}", getattr(screen, method)))
+                self.wrapped.append((screen, method))
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        # Drop the instance attributes so calls go straight to the class methods again
+        for screen, method in self.wrapped:
+            delattr(screen, method)
+        self.wrapped = []
+
+    def toggle(self, screens=()):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable(screens)
+
+    def samples(self):
+        """(name, depth, start, duration) oldest first, for what's still in the buffer."""
+        first = max(0, self.count - self.capacity)
+        for n in range(first, self.count):
+            i = n % self.capacity
+            yield self.names[self.name_ids[i]], self.depths[i], self.starts[i], self.durations[i]
+
+    def summary(self, frames=60):
+        """(fps, [(name, depth, ms per frame)]) averaged over the last few finished frames."""
+        frame_id = self.name_id("frame")
+        totals = {}
+        offsets = {}
+        frame_starts = []
+
+        # Walk back from the newest sample; a frame's sample comes after everything inside it
+        for n in range(self.count - 1, max(0, self.count - self.capacity) - 1, -1):
+            i = n % self.capacity
+            name_id = self.name_ids[i]
+            if name_id == frame_id:
+                if len(frame_starts) == frames:
+                    break
+                frame_starts.append(self.starts[i])
+            elif not frame_starts:
+                # Part of the frame still being drawn
+                continue
+            key = (name_id, self.depths[i])
+            totals[key] = totals.get(key, 0.0) + self.durations[i]
+            if key not in offsets:
+                # Listed in the order they start within a frame, so sub-timers follow their phase
+                offsets[key] = self.starts[i] - frame_starts[-1]
+
+        if len(frame_starts) < 2:
+            return 0.0, []
+        fps = (len(frame_starts) - 1) / max(frame_starts[0] - frame_starts[-1], 1e-9)
+        rows = [(self.names[name_id], depth, totals[name_id, depth] * 1000 / len(frame_starts))
+                for name_id, depth in sorted(totals, key=offsets.get)]
+        return fps, rows
+
+    def export_chrome(self, path):
+        """Write the buffer as Chrome trace-event JSON (complete "X" events in microseconds)."""
+        events = [{"name": name, "ph": "X", "pid": 0, "tid": 0,
+                   "ts": (start - self.origin) * 1e6, "dur": duration * 1e6}
+                  for name, _, start, duration in self.samples()]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+    def clear(self):
+        self.count = 0
+
+    def __repr__(self):
+        return f"Profiler({'on' if self.enabled else 'off'}, {min(self.count, self.capacity)}/{self.capacity} samples)"
+
+
+# Shared by GameState and the screens
+profiler = Profiler()
@@ -0,0 +1,261 @@
+"""Input recording and headless replay for Lan Party.
+
+GameState plays every input (starting the game, door clicks, ending the
+day, continuing after a rage or overflow, purchases, next day) through a
+Session and can append each one to a recording as it happens.  Since the
+party's RNG is seeded and the seed is in the recording's header, playing
+the same inputs through a Session again repeats the whole game without
+pygame.
+
+Recording format: b"LPR1", a little-endian u32 header length, a JSON header
+(seed and GameConfig), then one byte per input.  BUY is followed by a byte
+with the shop item's index, and after every input that ends a day (or wins) a CHECK
+record holds the party's COIN, REP, desks, turns remaining and deck size so
+a replay can say where a rules change first made things go differently.
+
+    python lan_party_replay.py game.lpr
+    python lan_party_replay.py game.lpr --render 0,12,40 --out frames
+"""
+import argparse
+import json
+import os
+import struct
+import time
+
+from lan_party_engine import Party, GameConfig, OVERFLOW, RAGED, WIN
+
+MAGIC = b"LPR1"
+
+# Recorded inputs
+START = 0
+DOOR = 1
+END_DAY = 2
+CONTINUE = 3
+NEXT_DAY = 4
+BUY = 5
+CHECK = 6
+INPUT_NAMES = ("start", "door", "end day", "continue", "next day", "buy", "check")
+
+CHECK_FORMAT = struct.Struct("<iiiii")
+
+# Every Session.screen
+SCREENS = ("title", "basement", "shop", "rage", "overflow", "win")
+
+
+class Session:
+    """Which screen the game is on and what each input does to the party."""
+
+    def __init__(self, party):
+        self.party = party
+        self.screen = "title"
+        self.shop_items = list(party.config.shop_items)
+
+    def play(self, action, arg=0):
+        """Apply an input, returns False if it does nothing on the current screen."""
+        party = self.party
+        screen = self.screen
+
+        if action == START and screen == "title" or action == NEXT_DAY and screen == "shop":
+            self.screen = "basement"
+            party.start_day()
+
+        elif action == DOOR and screen == "basement" and party.deck:
+            outcome = party.let_in_party().outcome
+            if outcome == OVERFLOW:
+                self.screen = "overflow"
+            elif outcome == RAGED:
+                self.screen = "rage"
+            elif outcome == WIN:
+                self.screen = "win"
+
+        elif action == END_DAY and screen == "basement":
+            party.end_day()
+            self.screen = "shop"
+
+        elif action == CONTINUE and screen in ("rage", "overflow"):
+            self.screen = "shop"
+
+        elif action == BUY and screen == "shop":
+            return party.buy(self.shop_items[arg])
+
+        else:
+            return False
+        return True
+
+
+def party_check(party):
+    return (party.coin, party.rep, party.desks, party.turns_remaining, len(party.deck))
+
+
+class Recorder:
+    """Appends a party's inputs to a recording, flushing each one so a crash keeps them."""
+
+    def __init__(self, path, party):
+        self.party = party
+        self.day = self.day_marker()
+        self.inputs = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        header = json.dumps({"seed": party.seed, "config": party.config.to_dict()}).encode()
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        self.file.flush()
+
+    def day_marker(self):
+        # Changes when a day ends, or when the fourth star (which doesn't end it) comes in
+        return self.party.turns_remaining, self.party.star_level >= 4
+
+    def record(self, action, arg=0):
+        data = bytes((action, arg)) if action == BUY else bytes((action,))
+        day = self.day_marker()
+        if day != self.day:
+            self.day = day
+            data += bytes((CHECK,)) + CHECK_FORMAT.pack(*party_check(self.party))
+        self.file.write(data)
+        self.file.flush()
+        self.inputs += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_recording(path):
+    """(header, [(action, arg)]) with CHECK args as state tuples.  A cut-off last input is dropped."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != MAGIC:
+        raise ValueError(f"{path} is not a Lan Party recording")
+
+    (length,) = struct.unpack_from("<I", data, 4)
+    header = json.loads(data[8:8 + length])
+    inputs = []
+    pos = 8 + length
+    while pos < len(data):
+        action = data[pos]
+        if action == BUY:
+            if pos + 2 > len(data):
+                break
+            inputs.append((action, data[pos + 1]))
+            pos += 2
+        elif action == CHECK:
+            if pos + 1 + CHECK_FORMAT.size > len(data):
+                break
+            inputs.append((action, CHECK_FORMAT.unpack_from(data, pos + 1)))
+            pos += 1 + CHECK_FORMAT.size
+        else:
+            inputs.append((action, 0))
+            pos += 1
+    return header, inputs
+
+
+class ReplayReport:
+    def __init__(self):
+        self.inputs = 0
+        self.checks = 0
+        self.ignored = []
+        self.divergence = None
+        self.seconds = 0.0
+        self.final = None
+
+    @property
+    def matched(self):
+        return self.divergence is None and not self.ignored
+
+    def __str__(self):
+        lines = [f"{self.inputs} inputs in {self.seconds * 1000:.2f}ms"
+                 f" ({self.inputs / max(self.seconds, 1e-9):,.0f} inputs/sec)",
+                 f"COIN {self.final[0]}, REP {self.final[1]}, desks {self.final[2]},"
+                 f" turns remaining {self.final[3]}, deck {self.final[4]}"]
+        if self.divergence:
+            index, recorded, replayed = self.divergence
+            lines.append(f"Diverged after input {index}: recorded (COIN, REP, desks, turns, deck) "
+                         f"{recorded}, replayed {replayed}")
+        elif self.ignored:
+            lines.append(f"Input {self.ignored[0]} did nothing on replay")
+        else:
+            lines.append(f"All {self.checks} end of day checks match")
+        return "\n".join(lines)
+
+
+def replay(path, config=None, game=None, on_input=None):
+    """Replay a recording on a fresh party, comparing every CHECK.
+
+    Runs on a headless Session unless game is given, in which case inputs go
+    through game.play_input (a GameState made with the recording's seed).
+    on_input(index) is called after each input.
+    """
+    header, inputs = read_recording(path)
+    if game is not None:
+        party = game.party
+        play = game.play_input
+    else:
+        config = config if config is not None else GameConfig.from_dict(header["config"])
+        party = Party(verbose=False, config=config, seed=header["seed"])
+        play = Session(party).play
+
+    report = ReplayReport()
+    start = time.perf_counter()
+    for action, arg in inputs:
+        if action == CHECK:
+            report.checks += 1
+            replayed = party_check(party)
+            if arg != replayed and report.divergence is None:
+                report.divergence = (report.inputs - 1, arg, replayed)
+            continue
+
+        if not play(action, arg):
+            report.ignored.append(report.inputs)
+        if on_input is not None:
+            on_input(report.inputs)
+        report.inputs += 1
+
+    report.seconds = time.perf_counter() - start
+    report.final = party_check(party)
+    return report
+
+
+def render_replay(path, frames, out_dir, config=None):
+    """Replay through the real screens, saving a screenshot after each input in frames."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    from lan_party import GameState
+
+    header, _ = read_recording(path)
+    config = config if config is not None else GameConfig.from_dict(header["config"])
+    game = GameState(config=config, seed=header["seed"], verbose=False)
+    os.makedirs(out_dir, exist_ok=True)
+
+    def on_input(index):
+        if index in frames:
+            game.settle()
+            game.current_screen.draw()
+            pygame.image.save(game.screen, os.path.join(out_dir, f"input_{index:05d}.png"))
+
+    return replay(path, game=game, on_input=on_input)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a Lan Party recording without a display.")
+    parser.add_argument("recording")
+    parser.add_argument("--config", default=None,
+                        help="GameConfig JSON file to replay with instead of the recorded one")
+    parser.add_argument("--render", default=None, metavar="N,N,...",
+                        help="Draw the screen after these inputs (0 is the first) and save them")
+    parser.add_argument("--out", default="replay_frames", help="Where --render saves its PNGs")
+    args = parser.parse_args()
+
+    config = GameConfig.load(args.config) if args.config else None
+    if args.render:
+        frames = {int(index) for index in args.render.split(",")}
+        report = render_replay(args.recording, frames, args.out, config)
+    else:
+        report = replay(args.recording, config)
+    print(report)
+    raise SystemExit(0 if report.matched else 1)
+
+
+if __name__ == '__main__':
+    main()
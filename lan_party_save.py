@@ -0,0 +1,358 @@
+"""Saving and resuming a game in progress.
+
+A save holds everything needed to carry on exactly where the player left
+off: the party's numbers, the deck in draw order, who's seated, the state of
+the party's RNG (so the next shuffles come out the same) and which screen
+was up.  Gamers are stored as one byte each, their type's position in the
+config's gamer_stats, so a deck of millions saves and loads in a few
+milliseconds with bytes.translate doing the work.  The frame that saves only
+copies the deck; renumbering it happens in encode(), on the Autosaver's thread.
+
+Format: b"LPSV", a little-endian u16 version, a u32 header length, a JSON
+header (seed, GameConfig, screen), then the binary state described at
+encode().  Files are written to a temp file and renamed over the old save,
+so a crash mid-write leaves the previous save intact.
+
+    python lan_party_save.py .saves/autosave.lps
+    python lan_party_save.py --check
+"""
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+from lan_party_engine import (Party, Deck, GameConfig, KeyedShuffle, MAX_TYPES, type_names, ability_config, let_in,
+                              CONTINUE, RAGED)
+from lan_party_replay import Session, SCREENS
+
+MAGIC = b"LPSV"
+VERSION = 1
+
+SAVED_FIELDS = ("desks", "desk_cost", "coin", "rep", "rage_level", "star_level", "turns_remaining",
+                "day_coin", "day_rep")
+FIELDS_FORMAT = struct.Struct(f"<{len(SAVED_FIELDS)}iB")
+
+# What kind of RNG the party had
+RNG_RANDOM = 0
+RNG_KEYED = 1
+MT_FORMAT = struct.Struct("<625I?d")
+KEYED_FORMAT = struct.Struct("<QQQ")
+
+# Stands for a gamer type the config doesn't have
+NO_TYPE = 255
+
+# Tables from type ids to positions in gamer_stats and back are bytes.translate
+# tables, which works because type ids are below MAX_TYPES
+assert MAX_TYPES == 256
+
+
+class SaveState:
+    """A copy of everything a save needs, taken between frames so it can be
+    encoded and written on another thread while the game carries on."""
+
+    def __init__(self, session):
+        party = session.party
+        config = party.config
+        self.header = {"seed": party.seed, "config": config.to_dict(), "screen": session.screen}
+        self.fields = tuple(getattr(party, field) for field in SAVED_FIELDS)
+
+        if len(config.gamer_stats) >= NO_TYPE:
+            raise ValueError(f"Can't save a config with {len(config.gamer_stats)} gamer types")
+
+        # Local type ids to positions in gamer_stats
+        table = bytearray([NO_TYPE]) * MAX_TYPES
+        for i, name in enumerate(config.gamer_stats):
+            table[config.new_gamer(name).type_id] = i
+        deck = party.deck
+        missing = [type_names[type_id] for type_id, count in enumerate(deck.counts)
+                   if count and table[type_id] == NO_TYPE]
+        missing += [gamer.name for gamer in party.in_party if table[gamer.type_id] == NO_TYPE]
+        if missing:
+            raise ValueError(f"Can't save gamers the config doesn't have: {sorted(set(missing))}")
+
+        self.lazy = deck.lazy
+        self.counts = [0] * len(config.gamer_stats)
+        for type_id, count in enumerate(deck.counts):
+            if count:
+                self.counts[table[type_id]] = count
+        # Just a copy of what's left of the order, encode() renumbers it.  A lazy deck has no order
+        self.order = b"" if deck.lazy else bytes(memoryview(deck.order)[deck.pos:])
+        self.table = bytes(table)
+        self.in_party = bytes(table[gamer.type_id] for gamer in party.in_party)
+        self.rng = rng_state(party.rng)
+
+
+def rng_state(rng):
+    if type(rng) is random.Random:
+        version, internal, gauss_next = rng.getstate()
+        return RNG_RANDOM, MT_FORMAT.pack(*internal, gauss_next is not None, gauss_next or 0.0)
+    if isinstance(rng, KeyedShuffle):
+        return RNG_KEYED, KEYED_FORMAT.pack(rng.seed, rng.stream, rng.shuffles)
+    raise ValueError(f"Can't save a party using {type(rng).__name__} for its RNG")
+
+
+def restore_rng(kind, data):
+    if kind == RNG_RANDOM:
+        *internal, has_gauss, gauss_next = MT_FORMAT.unpack(data)
+        rng = random.Random()
+        rng.setstate((3, tuple(internal), gauss_next if has_gauss else None))
+        return rng
+    if kind == RNG_KEYED:
+        seed, stream, shuffles = KEYED_FORMAT.unpack(data)
+        rng = KeyedShuffle(seed, stream)
+        rng.shuffles = shuffles
+        return rng
+    raise ValueError(f"Unknown RNG kind {kind}")
+
+
+def encode(state):
+    """The save file's bytes.
+
+    After the JSON header: SAVED_FIELDS as i32s and a lazy-deck flag, a u32
+    count of types and a u32 count of each in the deck, a u32 length and a byte
+    per gamer in draw order (none for a lazy deck), a u32 length and a byte per
+    seated gamer, then a u8 RNG kind, a u32 length and the RNG's state.
+    """
+    header = json.dumps(state.header).encode()
+    counts = state.counts
+    kind, rng = state.rng
+    # One pass in C renumbers the whole order
+    order = state.order.translate(state.table)
+    return b"".join([
+        MAGIC, struct.pack("<HI", VERSION, len(header)), header,
+        FIELDS_FORMAT.pack(*state.fields, state.lazy),
+        struct.pack(f"<I{len(counts)}I", len(counts), *counts),
+        struct.pack("<I", len(order)), order,
+        struct.pack("<I", len(state.in_party)), state.in_party,
+        struct.pack("<BI", kind, len(rng)), rng,
+    ])
+
+
+def write_atomic(path, data):
+    """Replace path with data, never leaving a half-written file behind."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def save(path, session):
+    write_atomic(path, encode(SaveState(session)))
+
+
+class SaveReader:
+    """Reads a save's data in order, raising ValueError if it ends early."""
+
+    def __init__(self, path, data, pos=0):
+        self.path = path
+        self.data = data
+        self.pos = pos
+
+    def take(self, count):
+        if self.pos + count > len(self.data):
+            raise ValueError(f"{self.path} is cut short")
+        chunk = self.data[self.pos:self.pos + count]
+        self.pos += count
+        return chunk
+
+    def unpack(self, fmt):
+        fmt = fmt if isinstance(fmt, struct.Struct) else struct.Struct(fmt)
+        return fmt.unpack(self.take(fmt.size))
+
+
+def load(path, verbose=True):
+    """The Session saved at path, with its party ready to carry on.
+
+    Raises ValueError if the file isn't a save this version can read, or is cut short or damaged.
+    """
+    with open(path, "rb") as f:
+        reader = SaveReader(path, f.read())
+    if reader.take(4) != MAGIC:
+        raise ValueError(f"{path} is not a Lan Party save")
+    version, length = reader.unpack("<HI")
+    if version > VERSION:
+        raise ValueError(f"{path} is from a newer version of the game (save version {version})")
+
+    header = reader.take(length)
+    try:
+        header = json.loads(header)
+        config = GameConfig.from_dict(header["config"])
+        seed, screen = header["seed"], header["screen"]
+        gamers = [config.new_gamer(name) for name in config.gamer_stats]
+    except (ValueError, KeyError, TypeError) as error:
+        raise ValueError(f"{path} has a damaged header: {error!r}") from None
+    if screen not in SCREENS:
+        raise ValueError(f"{path} is on an unknown screen {screen!r}")
+
+    *fields, lazy = reader.unpack(FIELDS_FORMAT)
+
+    # Positions in gamer_stats back to this process's type ids
+    table = bytearray([NO_TYPE]) * MAX_TYPES
+    for i, gamer in enumerate(gamers):
+        table[i] = gamer.type_id
+
+    (count,) = reader.unpack("<I")
+    if count != len(gamers):
+        raise ValueError(f"{path} has counts for {count} gamer types, its config has {len(gamers)}")
+    counts = [0] * len(type_names)
+    for gamer, type_count in zip(gamers, reader.unpack(f"<{count}I")):
+        counts[gamer.type_id] = type_count
+
+    (count,) = reader.unpack("<I")
+    order = reader.take(count)
+    if lazy:
+        deck = Deck(lazy=True)
+        for gamer in gamers:
+            if counts[gamer.type_id]:
+                deck.add_type(gamer, counts[gamer.type_id])
+    else:
+        if sum(counts) != count or order and max(order) >= len(gamers):
+            raise ValueError(f"{path} has a damaged deck")
+        deck = Deck.from_order(order.translate(table), counts, gamers)
+
+    (count,) = reader.unpack("<I")
+    seated = reader.take(count)
+    if seated and max(seated) >= len(gamers):
+        raise ValueError(f"{path} has a damaged party")
+    in_party = [gamers[i] for i in seated]
+
+    kind, count = reader.unpack("<BI")
+    try:
+        rng = restore_rng(kind, reader.take(count))
+    except (struct.error, TypeError) as error:
+        raise ValueError(f"{path} has a damaged RNG state: {error}") from None
+
+    party = Party(deck=deck, rng=rng, verbose=verbose, config=config, seed=seed)
+    for field, value in zip(SAVED_FIELDS, fields):
+        setattr(party, field, value)
+    party.in_party = in_party
+    for gamer in in_party:
+        if gamer.ability is not None:
+            party.listen(gamer)
+
+    session = Session(party)
+    session.screen = screen
+    return session
+
+
+class Autosaver:
+    """Writes saves on a background thread so the frame that asked never waits on the disk.
+
+    save() only takes a SaveState, which is a few copies.  If saves come in
+    faster than they can be written, the ones still waiting are replaced by
+    the newest.
+    """
+
+    def __init__(self, path, verbose=True):
+        self.path = path
+        self.verbose = verbose
+        self.pending = None
+        self.closed = False
+        self.saves = 0
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def save(self, session):
+        state = SaveState(session)
+        with self.condition:
+            self.pending = state
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                state, self.pending = self.pending, None
+            try:
+                write_atomic(self.path, encode(state))
+                self.saves += 1
+            except OSError as error:
+                if self.verbose:
+                    print(f"Couldn't save to {self.path}: {error}")
+
+    def close(self):
+        """Finish the last save and stop the thread."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+
+
+def check_listeners():
+    """Save a day with ability gamers seated, load it and check the listeners
+    load() rebuilds pay out like the originals, banking and raging."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "check.lps")
+        for ending in ("bank", "rage"):
+            party = Party(verbose=False, config=ability_config(), seed=1)
+            party.rep = 10
+            # A Tipper and two Sore Losers seated, two more angry gamers next in the deck
+            party.deck = Deck(party.config.new_gamer("Angry Gamer") for _ in range(2))
+            let_in(party, ["Calm Gamer", "Angry Gamer", "Angry Gamer"])
+            session = Session(party)
+            session.screen = "basement"
+            save(path, session)
+            loaded = load(path, verbose=False).party
+
+            listening = [{trigger: [gamer.name for gamer in gamers] for trigger, gamers in p.listeners.items()}
+                         for p in (party, loaded)]
+            if listening[0] != listening[1]:
+                raise AssertionError(f"Loaded listeners {listening[1]}, saved {listening[0]}")
+            for p in (party, loaded):
+                if ending == "bank":
+                    p.end_day()
+                elif p.let_in_party().outcome != CONTINUE or p.let_in_party().outcome != RAGED:
+                    raise AssertionError("Two more angry gamers didn't rage")
+            if (party.coin, party.rep) != (loaded.coin, loaded.rep):
+                raise AssertionError(f"After {ending}ing the loaded party has {loaded.coin} COIN {loaded.rep} REP,"
+                                     f" the saved one {party.coin} COIN {party.rep} REP")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show what's in a Lan Party save.")
+    parser.add_argument("save", nargs="?")
+    parser.add_argument("--check", action="store_true",
+                        help="Check that a loaded party's abilities pay out like the saved one's")
+    args = parser.parse_args()
+
+    if args.check:
+        check_listeners()
+        print("Loaded abilities pay out like the saved ones")
+    if args.save is None:
+        if not args.check:
+            parser.error("give a save to show, or --check")
+        return
+
+    start = time.perf_counter()
+    try:
+        session = load(args.save, verbose=False)
+    except ValueError as error:
+        sys.exit(f"Can't load it: {error}")
+    seconds = time.perf_counter() - start
+    party = session.party
+    print(f"Loaded {os.path.getsize(args.save):,} bytes in {seconds * 1000:.2f}ms")
+    print(f"Screen {session.screen}, COIN {party.coin}, REP {party.rep}, desks {party.desks},"
+          f" turns remaining {party.turns_remaining}")
+    print(f"Deck of {len(party.deck):,}: {party.deck.type_counts()}")
+    print(f"In the party: {len(party.in_party)}")
+
+
+if __name__ == '__main__':
+    main()
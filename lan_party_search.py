@@ -0,0 +1,217 @@
+"""Search buy orders and stopping policies over whole runs of the game.
+
+A strategy is a stopping policy from lan_party_sim plus a buy order: after
+every day the shop buys the first item on the list the party can afford,
+again and again until it can't afford anything on it.  Each strategy plays
+complete runs (until a win or turns_remaining hits 0) split into chunks that
+run on a process pool.  Every chunk is seeded from (seed, strategy, chunk),
+so results don't depend on which worker ran what, and finished chunks are
+appended to a checkpoint file so an interrupted search picks up where it
+left off.
+
+    python lan_party_search.py --runs 200 --max-order 3 --checkpoint search.jsonl
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from lan_party_engine import Party, GameConfig, DEFAULT_CONFIG, WIN
+from lan_party_sim import POLICIES, play_day
+
+
+class Strategy:
+    def __init__(self, policy, buy_order=()):
+        self.policy = policy
+        self.buy_order = tuple(buy_order)
+
+    @property
+    def key(self):
+        return f"{self.policy}|{'>'.join(self.buy_order)}"
+
+    @classmethod
+    def from_key(cls, key):
+        policy, _, order = key.partition("|")
+        return cls(policy, order.split(">") if order else ())
+
+    def __repr__(self):
+        return f"Strategy({self.key})"
+
+
+# Most a strategy buys in one visit to the shop, in case prices are low enough to never run out
+MAX_PURCHASES = 100
+
+
+def shop(party, buy_order, limit=MAX_PURCHASES):
+    """Spend the party's COIN and REP following a buy order, at most limit purchases."""
+    for _ in range(limit):
+        if not any(party.buy(name) for name in buy_order):
+            break
+
+
+def play_run(strategy, rng, config=None):
+    """Play one whole game, returns (won, days played, party)."""
+    party = Party(rng=rng, verbose=False, config=config)
+    policy = POLICIES[strategy.policy]
+    days = 0
+    while party.turns_remaining > 0:
+        days += 1
+        if play_day(party, policy) == WIN:
+            return True, days, party
+        shop(party, strategy.buy_order)
+    return False, days, party
+
+
+def evaluate(key, chunk, runs, seed, config=None):
+    """Play a chunk of runs for one strategy.  Runs in the worker processes."""
+    strategy = Strategy.from_key(key)
+    rng = random.Random(f"{seed}:{key}:{chunk}")
+    result = {"key": key, "chunk": chunk, "runs": runs, "seed": seed,
+              "wins": 0, "win_days": 0, "coin": 0, "rep": 0, "desks": 0}
+    for _ in range(runs):
+        won, days, party = play_run(strategy, rng, config)
+        if won:
+            result["wins"] += 1
+            result["win_days"] += days
+        result["coin"] += party.coin
+        result["rep"] += party.rep
+        result["desks"] += party.desks
+    return result
+
+
+def candidate_strategies(policies, max_order, config=DEFAULT_CONFIG):
+    for policy in policies:
+        for length in range(max_order + 1):
+            for buy_order in itertools.permutations(config.shop_items, length):
+                yield Strategy(policy, buy_order)
+
+
+def chunk_sizes(runs, chunk_runs):
+    """Runs in each chunk: chunk_runs, with whatever's left over in the last one."""
+    chunks = -(-runs // chunk_runs)
+    return [chunk_runs] * (chunks - 1) + [runs - (chunks - 1) * chunk_runs] if chunks else []
+
+
+def load_checkpoint(path, seed, sizes, config_key):
+    """Chunks already finished by an earlier search with the same settings and chunk sizes."""
+    done = {}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # A line cut short when the last search was killed
+                    continue
+                chunk = result["chunk"]
+                if (result["seed"] == seed and chunk < len(sizes) and result["runs"] == sizes[chunk]
+                        and result.get("config") == config_key):
+                    done[(result["key"], result["chunk"])] = result
+    return done
+
+
+def summarize(results):
+    """Merge chunk results into one row per strategy, best first."""
+    totals = {}
+    for result in results:
+        total = totals.setdefault(result["key"], {"key": result["key"], "runs": 0, "wins": 0,
+                                                  "win_days": 0, "coin": 0, "rep": 0, "desks": 0})
+        for field in ("runs", "wins", "win_days", "coin", "rep", "desks"):
+            total[field] += result[field]
+
+    rows = []
+    for total in totals.values():
+        runs = total["runs"]
+        rows.append({
+            "strategy": total["key"],
+            "runs": runs,
+            "win_rate": total["wins"] / runs,
+            "days_to_win": total["win_days"] / total["wins"] if total["wins"] else None,
+            "coin": total["coin"] / runs,
+            "rep": total["rep"] / runs,
+            "desks": total["desks"] / runs,
+        })
+    rows.sort(key=lambda row: (-row["win_rate"], row["days_to_win"] or float("inf"), -row["rep"]))
+    return rows
+
+
+def search(strategies, runs=200, chunk_runs=50, seed=0, workers=None, checkpoint=None, progress=True,
+           config=DEFAULT_CONFIG):
+    sizes = chunk_sizes(runs, chunk_runs)
+    tasks = [(strategy.key, chunk) for strategy in strategies for chunk in range(len(sizes))]
+    config_key = config.key()
+
+    done = load_checkpoint(checkpoint, seed, sizes, config_key)
+    results = [done[task] for task in tasks if task in done]
+    todo = [task for task in tasks if task not in done]
+    if progress and done:
+        print(f"Resuming: {len(results)}/{len(tasks)} chunks already in {checkpoint}")
+
+    start = last_report = time.perf_counter()
+    runs_done = 0
+    checkpoint_file = open(checkpoint, "a") if checkpoint else None
+    if checkpoint_file and checkpoint_file.tell():
+        # Start on a fresh line in case the last search died mid-write
+        checkpoint_file.write("\n")
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(evaluate, key, chunk, sizes[chunk], seed, config) for key, chunk in todo]
+            for finished, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                result["config"] = config_key
+                results.append(result)
+                runs_done += result["runs"]
+                if checkpoint_file:
+                    checkpoint_file.write(json.dumps(result) + "\n")
+                    checkpoint_file.flush()
+
+                now = time.perf_counter()
+                if progress and (now - last_report > 2 or finished == len(todo)):
+                    last_report = now
+                    rate = finished / (now - start)
+                    eta = (len(todo) - finished) / rate
+                    print(f"{len(tasks) - len(todo) + finished}/{len(tasks)} chunks,"
+                          f" {runs_done / (now - start):,.0f} runs/sec, ETA {eta:.0f}s", file=sys.stderr)
+    finally:
+        if checkpoint_file:
+            checkpoint_file.close()
+
+    return summarize(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the best buy orders and stopping policies.")
+    parser.add_argument("--runs", type=int, default=200, help="Runs per strategy")
+    parser.add_argument("--chunk-runs", type=int, default=50, help="Runs per task sent to a worker")
+    parser.add_argument("--max-order", type=int, default=2, help="Longest buy order to try")
+    parser.add_argument("--policies", default="cautious,no-overflow,optimal")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="Defaults to every core")
+    parser.add_argument("--checkpoint", default=None, help="JSON lines file to resume from")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", default=None, help="Write every strategy's result as JSON")
+    parser.add_argument("--config", default=None, help="GameConfig JSON file, defaults to the game's economy")
+    args = parser.parse_args()
+
+    config = GameConfig.load(args.config) if args.config else DEFAULT_CONFIG
+    strategies = list(candidate_strategies(args.policies.split(","), args.max_order, config))
+    rows = search(strategies, args.runs, args.chunk_runs, args.seed, args.workers, args.checkpoint,
+                  config=config)
+
+    print(f"{'strategy':<60}{'win rate':>9}{'days':>7}{'REP':>8}{'COIN':>7}{'desks':>7}")
+    for row in rows[:args.top]:
+        days = f"{row['days_to_win']:.1f}" if row["days_to_win"] else "-"
+        print(f"{row['strategy']:<60}{row['win_rate']:9.1%}{days:>7}{row['rep']:8.1f}"
+              f"{row['coin']:7.1f}{row['desks']:7.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""Headless Monte Carlo runner for Lan Party.
+
+Plays simulated days with the rules in lan_party_engine (no pygame/SDL) and
+reports how often a day wins, rages, overflows or gets banked.
+
+    python lan_party_sim.py --deck "Normal Gamer=3,Angry Gamer=3" --desks 5 --days 1000000
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from lan_party_engine import (Party, Deck, new_gamer, ability_config, let_in, GAMER_STATS, STARTING_DECK,
+                              ON_END_DAY, ON_RAGE, CONTINUE, BANKED, RAGED, WIN, OUTCOME_NAMES)
+from lan_party_solver import StoppingSolver
+
+
+# Stopping policies: given the party mid-day, return True to open the door again
+def always_open(party):
+    return True
+
+
+def cautious(party):
+    # Never risk an overflow and stop one angry gamer short of raging
+    return len(party.in_party) < party.desks and party.rage_level < 2
+
+
+def no_overflow(party):
+    return len(party.in_party) < party.desks
+
+
+# Shared by every party in the process so its memo table warms up once
+solver = StoppingSolver()
+
+
+def optimal(party):
+    return solver.should_open(party)
+
+
+POLICIES = {
+    "always": always_open,
+    "cautious": cautious,
+    "no-overflow": no_overflow,
+    "optimal": optimal,
+}
+
+
+def parse_deck(spec):
+    """Turn "Normal Gamer=3,Angry Gamer=3" into a list of gamer names."""
+    names = []
+    for part in spec.split(","):
+        name, _, count = part.partition("=")
+        name = name.strip()
+        if name not in GAMER_STATS:
+            raise ValueError(f"Unknown gamer type {name!r}")
+        names.extend([name] * int(count or 1))
+    return names
+
+
+def play_day(party, policy):
+    """Play one day to the end and return its outcome."""
+    party.start_day()
+    while party.deck and policy(party):
+        result = party.let_in_party()
+        if result.outcome != CONTINUE:
+            if result.outcome == WIN:
+                # The game stops on the win screen, the simulation starts a new day
+                party.end_day(win=True)
+            return result.outcome
+
+    party.end_day()
+    return BANKED
+
+
+class SimReport:
+    """Outcome counts and rewards over a number of simulated days."""
+
+    def __init__(self, days=0, outcomes=None, coin=0, rep=0, seconds=0.0):
+        self.days = days
+        self.outcomes = outcomes if outcomes is not None else [0] * len(OUTCOME_NAMES)
+        self.coin = coin
+        self.rep = rep
+        self.seconds = seconds
+
+    def merge(self, other):
+        self.days += other.days
+        self.outcomes = [a + b for a, b in zip(self.outcomes, other.outcomes)]
+        self.coin += other.coin
+        self.rep += other.rep
+        return self
+
+    def rate(self, outcome):
+        return self.outcomes[outcome] / self.days if self.days else 0.0
+
+    def rates(self):
+        return {name: self.rate(outcome) for outcome, name in enumerate(OUTCOME_NAMES) if outcome != CONTINUE}
+
+    def __str__(self):
+        lines = [f"{self.days} days in {self.seconds:.2f}s"
+                 f" ({self.days / max(self.seconds, 1e-9):,.0f} days/sec)"]
+        for name, rate in self.rates().items():
+            lines.append(f"  {name:<9}{rate:8.2%}")
+        lines.append(f"  COIN/day {self.coin / max(self.days, 1):.3f}")
+        lines.append(f"  REP/day  {self.rep / max(self.days, 1):.3f}")
+        return "\n".join(lines)
+
+
+def run_batch(deck, desks, days, seed, policy="always", lazy_deck=False):
+    """Simulate a batch of days on one party with its own seeded RNG."""
+    policy = POLICIES[policy]
+    party = Party(Deck([new_gamer(name) for name in deck], lazy=lazy_deck), desks=desks,
+                  rng=random.Random(seed), verbose=False)
+
+    outcomes = [0] * len(OUTCOME_NAMES)
+    for _ in range(days):
+        outcomes[play_day(party, policy)] += 1
+
+    return SimReport(days, outcomes, party.coin, party.rep)
+
+
+def monte_carlo(deck=STARTING_DECK, desks=5, days=100_000, seed=0, policy="always",
+                batch_size=100_000, workers=1, lazy_deck=False):
+    """Estimate outcome rates for a deck and desk count.
+
+    Days are split into batches seeded from (seed, batch number), so the result
+    only depends on the arguments and not on how many workers ran them.
+    """
+    batches = []
+    remaining = days
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        batches.append((list(deck), desks, size, f"{seed}:{len(batches)}", policy, lazy_deck))
+        remaining -= size
+
+    start = time.perf_counter()
+    report = SimReport()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for batch_report in pool.map(run_batch, *zip(*batches)):
+                report.merge(batch_report)
+    else:
+        for batch in batches:
+            report.merge(run_batch(*batch))
+    report.seconds = time.perf_counter() - start
+
+    return report
+
+
+def check_abilities():
+    """Play days that set off every trigger and compare with the payouts worked out by hand."""
+    config = ability_config()
+
+    # Greeter pays as it comes in, Hype when the next seat is taken, Tipper when the day is banked
+    party = Party(verbose=False, config=config)
+    names = ["Rich Gamer", "Normal Gamer", "Calm Gamer", "Normal Gamer"]
+    if let_in(party, names) != CONTINUE:
+        raise AssertionError("The banked day ended early")
+    gamers = [config.new_gamer(name) for name in names]
+    day_coin = sum(gamer.coin for gamer in gamers) + 1
+    day_rep = sum(gamer.rep for gamer in gamers) + 1
+    if (party.day_coin, party.day_rep) != (day_coin, day_rep):
+        raise AssertionError(f"on_enter/on_neighbour_enter paid {party.day_coin} COIN {party.day_rep} REP,"
+                             f" expected {day_coin} COIN {day_rep} REP")
+    if party.listeners[ON_END_DAY] != [gamers[2]] or party.listeners[ON_RAGE]:
+        raise AssertionError(f"Wrong listeners {party.listeners}")
+    party.end_day()
+    if (party.coin, party.rep) != (day_coin + 1, day_rep):
+        raise AssertionError(f"on_end_day left {party.coin} COIN {party.rep} REP,"
+                             f" expected {day_coin + 1} COIN {day_rep} REP")
+    if party.listeners[ON_END_DAY]:
+        raise AssertionError("Listeners outlived the day")
+
+    # Each Sore Loser in the party costs 1 REP when it rages out
+    party = Party(verbose=False, config=config)
+    party.rep = 10
+    if let_in(party, ["Angry Gamer"] * 3) != RAGED:
+        raise AssertionError("Three angry gamers didn't rage")
+    if (party.coin, party.rep) != (0, 7):
+        raise AssertionError(f"on_rage left {party.coin} COIN {party.rep} REP, expected 0 COIN 7 REP")
+    if party.listeners[ON_RAGE]:
+        raise AssertionError("Listeners outlived the day")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate Lan Party days without a display.")
+    parser.add_argument("--deck", default=None,
+                        help='Comma separated "name=count" list, defaults to the starting deck')
+    parser.add_argument("--desks", type=int, default=5)
+    parser.add_argument("--days", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="always")
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--lazy-deck", action="store_true",
+                        help="Sample draws from the deck counts instead of keeping a shuffled order")
+    parser.add_argument("--check", action="store_true", help="Also check that every ability trigger pays out")
+    args = parser.parse_args()
+
+    deck = parse_deck(args.deck) if args.deck else STARTING_DECK
+    report = monte_carlo(deck, args.desks, args.days, args.seed, args.policy,
+                         args.batch_size, args.workers, args.lazy_deck)
+    print(report)
+
+    if args.check:
+        check_abilities()
+        print("Ability triggers pay out as expected")
+
+
+if __name__ == '__main__':
+    main()
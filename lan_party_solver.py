@@ -0,0 +1,111 @@
+"""Exact "open the door or end the day" solver.
+
+Works over gamer types rather than Gamer objects: a state is the remaining
+count of each type plus the party's rage level, star level, seats used,
+desks and what banking now would pay.  Values are memoized in a bounded
+table shared by every call, so after the first decision of a day the rest
+are a dictionary lookup.  The table is for one set of gamer stats; deciding
+for a deck whose types have other stats clears it.
+"""
+from collections import OrderedDict
+
+
+class StoppingSolver:
+    """Expected-value maximizing policy for Party.let_in_party vs Party.end_day.
+
+    The value of a day is coin_weight * COIN + rep_weight * REP banked at the
+    end of it, or win_value if four stars make it in.  Raging or overflowing
+    is worth nothing.
+
+    Gamer abilities aren't modelled, values only count stats.  With
+    abilities in play (GameConfig.ability_types) this is still a sensible
+    policy but no longer the optimal one.
+    """
+
+    def __init__(self, coin_weight=1.0, rep_weight=1.0, win_value=1000.0, max_entries=1_000_000):
+        self.coin_weight = coin_weight
+        self.rep_weight = rep_weight
+        self.win_value = win_value
+        self.max_entries = max_entries
+        self.memo = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._types = ()
+
+    def use_types(self, deck):
+        """Take (rage, star, weighted reward) per type id from the gamers a deck deals."""
+        types = tuple((gamer.rage, gamer.star, self.coin_weight * gamer.coin + self.rep_weight * gamer.rep)
+                      if gamer is not None else (0, 0, 0.0) for gamer in deck.types)
+        if types != self._types:
+            # Values worked out for other stats don't hold any more
+            self._types = types
+            self.memo.clear()
+
+    def bank_value(self, party):
+        return self.coin_weight * party.day_coin + self.rep_weight * party.day_rep
+
+    def open_value(self, counts, rage, star, seats, desks, bank):
+        """Expected value of letting one more gamer in, playing optimally afterwards."""
+        size = sum(counts)
+        if not size:
+            return 0.0
+        if seats + 1 > desks:
+            return 0.0
+
+        types = self._types
+        total = 0.0
+        for type_id, count in enumerate(counts):
+            if not count:
+                continue
+            type_rage, type_star, reward = types[type_id]
+            if rage + type_rage >= 3:
+                continue
+            if star + type_star == 4:
+                total += count * self.win_value
+                continue
+
+            remaining = list(counts)
+            remaining[type_id] -= 1
+            total += count * self.value(tuple(remaining), rage + type_rage, star + type_star,
+                                        seats + 1, desks, bank + reward)
+        return total / size
+
+    def value(self, counts, rage, star, seats, desks, bank):
+        """Value of a state when the player picks the better of opening and banking from here on."""
+        key = (counts, rage, star, seats, desks, bank)
+        memo = self.memo
+        value = memo.get(key)
+        if value is not None:
+            self.hits += 1
+            memo.move_to_end(key)
+            return value
+
+        self.misses += 1
+        value = max(bank, self.open_value(counts, rage, star, seats, desks, bank))
+        memo[key] = value
+        if len(memo) > self.max_entries:
+            memo.popitem(last=False)
+        return value
+
+    def state(self, party):
+        counts = list(party.deck.counts)
+        while counts and not counts[-1]:
+            counts.pop()
+        return (tuple(counts), party.rage_level, party.star_level, len(party.in_party),
+                party.desks, self.bank_value(party))
+
+    def decide(self, party):
+        """(open value, bank value) for the party's current state."""
+        self.use_types(party.deck)
+        counts, rage, star, seats, desks, bank = self.state(party)
+        return self.open_value(counts, rage, star, seats, desks, bank), bank
+
+    def should_open(self, party):
+        open_value, bank = self.decide(party)
+        return open_value > bank
+
+    def clear(self):
+        self.memo.clear()
+
+    def __repr__(self):
+        return f"StoppingSolver({len(self.memo)} states, {self.hits} hits, {self.misses} misses)"
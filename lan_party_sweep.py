@@ -0,0 +1,249 @@
+"""Economy balancing sweep over grids of GameConfig values.
+
+Every cell of the grid is a GameConfig played for a number of whole runs
+with one strategy from lan_party_search.  Results are cached on disk under
+a hash of the config's contents plus the run settings, so changing one axis
+of a sweep only simulates the cells that are new.
+
+    python lan_party_sweep.py --grid desk_cost=3,5,7 --grid "price:Star Gamer=20,25,30" --csv sweep.csv
+    python lan_party_sweep.py --grid "rep:Normal Gamer=1..30" --runs 50
+
+Values are a comma separated list, or lo..hi for every whole number in between.
+
+Grid parameters:
+    desks, desk_cost, desk_cost_step, turns   the GameConfig fields
+    price:<shop item>                         what the shop charges
+    deck:<gamer>                              how many start in the deck
+    rep:<gamer> coin:<gamer> rage:<gamer> star:<gamer>   gamer stats
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from lan_party_engine import GameConfig, DEFAULT_CONFIG, STAT_FIELDS, type_names
+from lan_party_search import Strategy, evaluate, summarize
+
+
+def parse_axis(spec):
+    """Turn "price:Star Gamer=20,25,30" into ("price:Star Gamer", [20, 25, 30]), "=1..3" into [1, 2, 3]."""
+    param, _, values = spec.partition("=")
+    if not values:
+        raise ValueError(f"Grid {spec!r} has no values")
+    low, dots, high = values.partition("..")
+    if dots:
+        return param.strip(), list(range(int(low), int(high) + 1))
+    return param.strip(), [int(value) for value in values.split(",")]
+
+
+def apply(config, param, value):
+    """Set one grid parameter on a config in place."""
+    kind, _, name = param.partition(":")
+    if not name:
+        if kind not in ("desks", "desk_cost", "desk_cost_step", "turns"):
+            raise ValueError(f"Unknown parameter {param!r}")
+        if kind == "desk_cost" and value <= 0 or kind == "desk_cost_step" and value < 0:
+            raise ValueError(f"{param}={value}: desks must cost something and not get cheaper")
+        setattr(config, kind, value)
+
+    elif kind == "price":
+        if name not in config.shop_items:
+            raise ValueError(f"Unknown shop item {name!r}")
+        if value <= 0:
+            raise ValueError(f"{param}={value}: shop items must cost something")
+        config.shop_items[name] = (value, config.shop_items[name][1])
+
+    elif kind == "deck":
+        if name not in config.gamer_stats:
+            raise ValueError(f"Unknown gamer type {name!r}")
+        config.starting_deck = [gamer for gamer in config.starting_deck if gamer != name] + [name] * value
+
+    elif kind in STAT_FIELDS:
+        if name not in config.gamer_stats:
+            raise ValueError(f"Unknown gamer type {name!r}")
+        stats = list(config.gamer_stats[name])
+        stats[STAT_FIELDS.index(kind)] = value
+        config.gamer_stats[name] = tuple(stats)
+
+    else:
+        raise ValueError(f"Unknown parameter {param!r}")
+
+
+def grid_cells(base, axes):
+    """(values, config) for every combination of the axes."""
+    params = [param for param, _ in axes]
+    for values in itertools.product(*(values for _, values in axes)):
+        config = base.copy()
+        for param, value in zip(params, values):
+            apply(config, param, value)
+        yield values, config
+
+
+class ResultCache:
+    """One JSON file per simulated cell, named by what went into it."""
+    VERSION = 1
+
+    def __init__(self, cache_dir=".sweep_cache"):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, config, strategy, runs, seed):
+        text = f"{self.VERSION}:{config.key()}:{strategy.key}:{runs}:{seed}"
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self.path(key)) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        # Write to a temp file first so a killed sweep never leaves half a result behind
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(result, f)
+        os.replace(temp_path, path)
+
+    def __repr__(self):
+        return f"ResultCache({self.cache_dir}, {self.hits} hits, {self.misses} misses)"
+
+
+def sweep(axes, base=DEFAULT_CONFIG, strategy=Strategy("optimal", ("Star Gamer", "New Desk")),
+          runs=200, seed=0, workers=None, cache=None, progress=True):
+    """Simulate every cell of the grid, returns one row per cell in grid order."""
+    cache = cache if cache is not None else ResultCache()
+    cells = list(grid_cells(base, axes))
+    keys = [cache.key(config, strategy, runs, seed) for _, config in cells]
+    results = [cache.get(key) for key in keys]
+    todo = [i for i, result in enumerate(results) if result is None]
+    if progress:
+        print(f"{len(cells) - len(todo)}/{len(cells)} cells cached, simulating {len(todo)}", file=sys.stderr)
+
+    if todo:
+        start = last_report = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(evaluate, strategy.key, 0, runs, seed, cells[i][1]): i for i in todo}
+            for finished, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                results[i] = future.result()
+                cache.put(keys[i], results[i])
+
+                now = time.perf_counter()
+                if progress and (now - last_report > 2 or finished == len(todo)):
+                    last_report = now
+                    eta = (len(todo) - finished) * (now - start) / finished
+                    print(f"{finished}/{len(todo)} cells, ETA {eta:.0f}s", file=sys.stderr)
+
+    rows = []
+    for (values, _), result in zip(cells, results):
+        row = summarize([result])[0]
+        row.update(zip((param for param, _ in axes), values))
+        rows.append(row)
+    return rows
+
+
+def tables(axes, rows, metric, fmt):
+    """A text table of one metric: first axis down the side, the rest across the top."""
+    params = [param for param, _ in axes]
+    row_param, column_params = params[0], params[1:]
+    columns = [", ".join(f"{param}={value}" for param, value in zip(column_params, values)) or metric
+               for values in itertools.product(*(values for _, values in axes[1:]))]
+    width = max(10, *(len(column) + 2 for column in columns))
+
+    lines = [f"{row_param:<24}" + "".join(f"{column:>{width}}" for column in columns)]
+    for row_value, cells in zip(axes[0][1], zip(*[iter(rows)] * len(columns))):
+        lines.append(f"{row_value:<24}" + "".join(
+            f"{(fmt.format(cell[metric]) if cell[metric] is not None else '-'):>{width}}" for cell in cells))
+    return "\n".join(lines)
+
+
+def write_csv(path, axes, rows):
+    fields = [param for param, _ in axes] + ["runs", "win_rate", "days_to_win", "coin", "rep", "desks"]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def check_many_cells(cells=300, runs=2, workers=1):
+    """Sweep more stat variants than a deck order has room for type ids, and
+    check the pool's results against playing every cell in this process."""
+    axes = [("rep:Normal Gamer", list(range(1, cells + 1)))]
+    strategy = Strategy("optimal", ("Star Gamer", "New Desk"))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        rows = sweep(axes, strategy=strategy, runs=runs, workers=workers, cache=ResultCache(cache_dir),
+                     progress=False)
+
+    names = len(type_names)
+    for row, (values, config) in zip(rows, grid_cells(DEFAULT_CONFIG, axes)):
+        expected = summarize([evaluate(strategy.key, 0, runs, 0, config)])[0]
+        if any(row[field] != expected[field] for field in expected):
+            raise AssertionError(f"Cell {values} differs when played here:\n{row}\n{expected}")
+    if len(type_names) != names:
+        raise AssertionError(f"Stat variants added gamer types: {type_names}")
+    if len({row["rep"] for row in rows}) < 2:
+        raise AssertionError("Every cell came out the same, the variants weren't played")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the economy over a grid of config values.")
+    parser.add_argument("--grid", action="append", default=[], metavar="PARAM=V1,V2,...",
+                        help="An axis of the sweep, repeat for more axes")
+    parser.add_argument("--config", default=None, help="Base GameConfig JSON file")
+    parser.add_argument("--dump-config", default=None, metavar="PATH",
+                        help="Write the base config as JSON to edit, then exit")
+    parser.add_argument("--strategy", default="optimal|Star Gamer>New Desk",
+                        help='Stopping policy and buy order, "policy|item>item"')
+    parser.add_argument("--runs", type=int, default=200, help="Runs per cell")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="Defaults to every core")
+    parser.add_argument("--cache-dir", default=".sweep_cache")
+    parser.add_argument("--csv", default=None, help="Write every cell as a CSV row")
+    parser.add_argument("--check", action="store_true",
+                        help="Sweep 300 stat variants and compare with playing them in one process, then exit")
+    args = parser.parse_args()
+
+    if args.check:
+        check_many_cells()
+        print("300 cells match")
+        return
+
+    base = GameConfig.load(args.config) if args.config else DEFAULT_CONFIG
+    if args.dump_config:
+        base.save(args.dump_config)
+        return
+    if not args.grid:
+        parser.error("give at least one --grid axis")
+
+    axes = [parse_axis(spec) for spec in args.grid]
+    cache = ResultCache(args.cache_dir)
+    rows = sweep(axes, base, Strategy.from_key(args.strategy), args.runs, args.seed, args.workers, cache)
+
+    print("Win rate")
+    print(tables(axes, rows, "win_rate", "{:.1%}"))
+    print("\nTurns to win")
+    print(tables(axes, rows, "days_to_win", "{:.1f}"))
+    print(f"\n{cache}")
+
+    if args.csv:
+        write_csv(args.csv, axes, rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""Struct-of-arrays version of the Party rules for simulating many parties at once.
+
+Every party lives in row i of a set of NumPy arrays and each call advances all
+rows together.  Decks hold gamer type ids (indexes into VectorParty.types,
+the config's gamer_stats in order) laid out as [in party | still in the deck],
+with pos marking where the next draw comes from, so a draw is one gather for
+the whole batch.
+
+Seeded with the same seed, row i deals exactly like a scalar
+Party(rng=KeyedShuffle(seed, i)), see check_against_scalar().
+
+    python lan_party_vector.py --parties 10000 --days 100
+"""
+import argparse
+import time
+
+import numpy as np
+
+from lan_party_engine import (Party, KeyedShuffle, GameConfig, DEFAULT_CONFIG,
+                              CONTINUE, BANKED, OVERFLOW, RAGED, WIN, OUTCOME_NAMES)
+from lan_party_sim import POLICIES as SCALAR_POLICIES, SimReport, parse_deck, play_day
+
+# Row isn't playing a day (between end_day and start_day, or finished)
+IDLE = -1
+
+# Gamer types of the default config, in type id order
+GAMER_TYPES = tuple(DEFAULT_CONFIG.gamer_stats)
+
+_C0 = np.uint64(0x9E3779B97F4A7C15)
+_C1 = np.uint64(0xBF58476D1CE4E5B9)
+_C2 = np.uint64(0x94D049BB133111EB)
+
+
+def mix64(x):
+    """lan_party_engine.mix64 over a uint64 array (wrapping arithmetic)."""
+    x = x + _C0
+    x ^= x >> np.uint64(30)
+    x *= _C1
+    x ^= x >> np.uint64(27)
+    x *= _C2
+    return x ^ (x >> np.uint64(31))
+
+
+class VectorParty:
+    def __init__(self, n, deck=None, desks=None, seed=0, first_stream=0, config=None):
+        """n parties playing by config's rules, starting with deck and desks (the config's by default)."""
+        self.config = config if config is not None else DEFAULT_CONFIG
+        self.check_config(self.config)
+        self.n = n
+        self.rows = np.arange(n)
+
+        # Stats per type id
+        self.types = tuple(self.config.gamer_stats)
+        self.type_ids = {name: type_id for type_id, name in enumerate(self.types)}
+        self.type_rep, self.type_coin, self.type_rage, self.type_star = (
+            np.array(column, dtype=np.int64) for column in zip(*self.config.gamer_stats.values()))
+
+        deck = deck if deck is not None else self.config.starting_deck
+        desks = desks if desks is not None else self.config.desks
+        self.start_deck = np.array([self.type_ids[name] for name in deck],
+                                   dtype=np.int8 if len(self.types) <= 128 else np.int16)
+        self.start_desks = desks
+        self.deck = np.tile(self.start_deck, (n, 1))
+        self.deck_len = np.full(n, len(self.start_deck), dtype=np.int64)
+        self.pos = np.zeros(n, dtype=np.int64)
+
+        self.desks = np.full(n, desks, dtype=np.int64)
+        self.desk_cost = np.full(n, self.config.desk_cost, dtype=np.int64)
+        self.coin = np.zeros(n, dtype=np.int64)
+        self.rep = np.zeros(n, dtype=np.int64)
+        self.rage_level = np.zeros(n, dtype=np.int64)
+        self.star_level = np.zeros(n, dtype=np.int64)
+        self.turns_remaining = np.full(n, self.config.turns, dtype=np.int64)
+
+        # What the gamers in the party would pay out if the day was banked now
+        self.day_coin = np.zeros(n, dtype=np.int64)
+        self.day_rep = np.zeros(n, dtype=np.int64)
+
+        self.in_day = np.zeros(n, dtype=bool)
+
+        # Per-row KeyedShuffle state, row i is stream first_stream + i
+        seed = np.uint64(seed & ((1 << 64) - 1))
+        streams = np.arange(first_stream, first_stream + n, dtype=np.uint64)
+        self.stream_key = mix64(mix64(np.full(n, seed, dtype=np.uint64)) ^ streams)
+        self.shuffles = np.zeros(n, dtype=np.uint64)
+
+    def reset(self, mask=None):
+        """Start the masked rows over with a new game.  Their shuffle streams carry on."""
+        rows = np.flatnonzero(self._mask(mask))
+        if not rows.size:
+            return
+        self.deck[rows] = 0
+        self.deck[rows, :len(self.start_deck)] = self.start_deck
+        self.deck_len[rows] = len(self.start_deck)
+        self.pos[rows] = 0
+        self.desks[rows] = self.start_desks
+        self.desk_cost[rows] = self.config.desk_cost
+        for array in (self.coin, self.rep, self.rage_level, self.star_level, self.day_coin, self.day_rep):
+            array[rows] = 0
+        self.turns_remaining[rows] = self.config.turns
+        self.in_day[rows] = False
+
+    @staticmethod
+    def check_config(config):
+        """Raise ValueError for a config VectorParty can't play."""
+        # Abilities run arbitrary code per gamer, which has no array version
+        with_abilities = config.ability_types
+        if with_abilities:
+            raise ValueError(f"VectorParty can't play abilities, the config gives them to {', '.join(with_abilities)}")
+
+    @property
+    def in_party_count(self):
+        return self.pos
+
+    def _mask(self, mask):
+        if mask is None:
+            return np.ones(self.n, dtype=bool)
+        return np.broadcast_to(np.asarray(mask, dtype=bool), (self.n,))
+
+    def start_day(self, mask=None):
+        """Shuffle the decks of the masked rows and start their day."""
+        rows = np.flatnonzero(self._mask(mask))
+        if rows.size:
+            self._shuffle(rows)
+            self.in_day[rows] = True
+
+    def _shuffle(self, rows):
+        width = self.deck.shape[1]
+        base = mix64(self.stream_key[rows] ^ self.shuffles[rows])
+        keys = mix64(base[:, None] + np.arange(width, dtype=np.uint64))
+
+        # Empty slots past the end of the deck sort last
+        keys[np.arange(width) >= self.deck_len[rows, None]] = np.iinfo(np.uint64).max
+
+        order = np.argsort(keys, axis=1, kind="stable")
+        self.deck[rows] = np.take_along_axis(self.deck[rows], order, axis=1)
+        self.shuffles[rows] += np.uint64(1)
+
+    def let_in_party(self, mask=None):
+        """Draw one gamer for each masked row that is playing a day.
+
+        Returns the outcome per row (IDLE for rows that didn't draw).  Overflow,
+        rage and win end the row's day, like lan_party_sim.play_day does.
+        """
+        outcome = np.full(self.n, IDLE, dtype=np.int8)
+        rows = np.flatnonzero(self._mask(mask) & self.in_day & (self.pos < self.deck_len))
+        if not rows.size:
+            return outcome
+
+        gamer = self.deck[rows, self.pos[rows]]
+        self.pos[rows] += 1
+        self.rage_level[rows] += self.type_rage[gamer]
+        self.star_level[rows] += self.type_star[gamer]
+        self.day_coin[rows] += self.type_coin[gamer]
+        self.day_rep[rows] += self.type_rep[gamer]
+
+        # Same order of checks as Party.let_in_party
+        overflow = self.pos[rows] > self.desks[rows]
+        raged = ~overflow & (self.rage_level[rows] >= 3)
+        win = ~overflow & ~raged & (self.star_level[rows] == 4)
+
+        result = np.full(rows.size, CONTINUE, dtype=np.int8)
+        result[overflow] = OVERFLOW
+        result[raged] = RAGED
+        result[win] = WIN
+        outcome[rows] = result
+
+        ended = rows[result != CONTINUE]
+        if ended.size:
+            self._end_day(ended, rewards=False)
+        return outcome
+
+    def end_day(self, mask=None):
+        """Bank the day for the masked rows that are playing one."""
+        rows = np.flatnonzero(self._mask(mask) & self.in_day)
+        if rows.size:
+            self._end_day(rows, rewards=True)
+
+    def _end_day(self, rows, rewards):
+        if rewards:
+            self.coin[rows] += self.day_coin[rows]
+            self.rep[rows] += self.day_rep[rows]
+
+        # deck.extend(in_party): rotate [in party | deck] into [deck | in party]
+        width = self.deck.shape[1]
+        cols = np.arange(width)[None, :]
+        length = np.maximum(self.deck_len[rows, None], 1)
+        source = np.where(cols < length, (cols + self.pos[rows, None]) % length, cols)
+        self.deck[rows] = np.take_along_axis(self.deck[rows], source, axis=1)
+
+        self.pos[rows] = 0
+        self.turns_remaining[rows] -= 1
+        self.rage_level[rows] = 0
+        self.star_level[rows] = 0
+        self.day_coin[rows] = 0
+        self.day_rep[rows] = 0
+        self.in_day[rows] = False
+
+    def step(self, open_door=True, auto_start=True):
+        """Advance every playing row by one decision.
+
+        Rows with open_door set let the next gamer in, the rest end the day
+        (as do rows with nothing left to draw).  With auto_start, rows whose
+        day ended start the next one straight away.
+        """
+        open_door = self._mask(open_door)
+        playing = self.in_day.copy()
+
+        bank = playing & ~(open_door & (self.pos < self.deck_len))
+        outcome = self.let_in_party(playing & ~bank)
+        if bank.any():
+            self.end_day(bank)
+            outcome[bank] = BANKED
+
+        if auto_start:
+            self.start_day(playing & ~self.in_day)
+        return outcome
+
+    def type_counts(self):
+        """(still in the deck, in the party) counts per gamer type, each an (n, types) array."""
+        cols = np.arange(self.deck.shape[1])[None, :]
+        drawn = cols < self.pos[:, None]
+        waiting = ~drawn & (cols < self.deck_len[:, None])
+        deck_counts = np.empty((self.n, len(self.types)), dtype=np.int64)
+        party_counts = np.empty((self.n, len(self.types)), dtype=np.int64)
+        for type_id in range(len(self.types)):
+            is_type = self.deck == type_id
+            deck_counts[:, type_id] = (is_type & waiting).sum(axis=1)
+            party_counts[:, type_id] = (is_type & drawn).sum(axis=1)
+        return deck_counts, party_counts
+
+    def buy(self, name, mask=None):
+        """Party.buy for the masked rows, returns which rows could afford it."""
+        mask = self._mask(mask)
+        cost, currency = self.config.shop_items[name]
+        wallet = getattr(self, currency)
+        bought = mask & (wallet >= cost)
+        if name == "New Desk":
+            bought &= self.coin >= self.desk_cost
+            self.desks[bought] += 1
+            self.desk_cost[bought] += self.config.desk_cost_step
+        else:
+            self.add_gamer(name, bought)
+        wallet[bought] -= cost
+        return bought
+
+    def add_gamer(self, name, mask=None):
+        """Append a gamer to the end of the masked rows' decks (like a shop purchase)."""
+        rows = np.flatnonzero(self._mask(mask))
+        if not rows.size:
+            return
+        if self.deck_len[rows].max() >= self.deck.shape[1]:
+            grown = np.zeros((self.n, self.deck.shape[1] * 2), dtype=self.deck.dtype)
+            grown[:, :self.deck.shape[1]] = self.deck
+            self.deck = grown
+        self.deck[rows, self.deck_len[rows]] = self.type_ids[name]
+        self.deck_len[rows] += 1
+
+
+# Vector versions of the stopping policies in lan_party_sim
+POLICIES = {
+    "always": lambda vp: np.ones(vp.n, dtype=bool),
+    "cautious": lambda vp: (vp.pos < vp.desks) & (vp.rage_level < 2),
+    "no-overflow": lambda vp: vp.pos < vp.desks,
+}
+
+
+def simulate(n=10_000, deck=None, desks=None, days=100, seed=0, policy="always", config=None):
+    """Play `days` days on each of n parties and return a SimReport plus the VectorParty."""
+    policy = POLICIES[policy]
+    vp = VectorParty(n, deck, desks, seed, config=config)
+    days_played = np.zeros(n, dtype=np.int64)
+    outcomes = [0] * len(OUTCOME_NAMES)
+
+    start = time.perf_counter()
+    vp.start_day()
+    while vp.in_day.any():
+        outcome = vp.step(policy(vp), auto_start=False)
+        ended = outcome > CONTINUE
+        days_played[ended] += 1
+        for code, count in enumerate(np.bincount(outcome[ended], minlength=len(OUTCOME_NAMES))):
+            outcomes[code] += int(count)
+        vp.start_day(ended & (days_played < days))
+    seconds = time.perf_counter() - start
+
+    report = SimReport(n * days, outcomes, int(vp.coin.sum()), int(vp.rep.sum()), seconds)
+    return report, vp
+
+
+def check_against_scalar(n=8, deck=None, desks=None, days=200, seed=0, policy="always", config=None):
+    """Replay the first n rows with scalar Party objects and compare the results."""
+    _, vp = simulate(n, deck, desks, days, seed, policy, config)
+    for i in range(n):
+        party = Party([vp.config.new_gamer(vp.types[t]) for t in vp.start_deck], desks=vp.start_desks,
+                      rng=KeyedShuffle(seed, i), verbose=False, config=vp.config)
+        for _ in range(days):
+            play_day(party, SCALAR_POLICIES[policy])
+
+        scalar = ([g.name for g in party.deck], party.coin, party.rep, party.turns_remaining)
+        vector = ([vp.types[t] for t in vp.deck[i, :vp.deck_len[i]]],
+                  int(vp.coin[i]), int(vp.rep[i]), int(vp.turns_remaining[i]))
+        if scalar != vector:
+            raise AssertionError(f"Party {i} differs from the scalar rules:\n{scalar}\n{vector}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many Lan Party parties in lockstep.")
+    parser.add_argument("--parties", type=int, default=10_000)
+    parser.add_argument("--deck", default=None,
+                        help='Comma separated "name=count" list, defaults to the starting deck')
+    parser.add_argument("--desks", type=int, default=None, help="Defaults to the config's")
+    parser.add_argument("--days", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="always")
+    parser.add_argument("--config", default=None, help="GameConfig JSON file, defaults to the game's economy")
+    parser.add_argument("--check", action="store_true",
+                        help="Also replay a few parties with the scalar rules and compare")
+    args = parser.parse_args()
+
+    config = GameConfig.load(args.config) if args.config else DEFAULT_CONFIG
+    deck = parse_deck(args.deck) if args.deck else None
+    report, _ = simulate(args.parties, deck, args.desks, args.days, args.seed, args.policy, config)
+    print(report)
+
+    if args.check:
+        check_against_scalar(deck=deck, desks=args.desks, days=args.days, seed=args.seed, policy=args.policy,
+                             config=config)
+        print("Matches the scalar rules")
+
+
+if __name__ == '__main__':
+    main()